@@ -0,0 +1,33 @@
+from utils.construct_response import construct_response
+from utils.course_messages import backfill_index_keys
+from utils.course_stats import backfill_engagement_stats, backfill_material_stats
+
+# No new page is started once less than this is left of the invocation
+STOP_MARGIN_MILLIS = 60 * 1000
+
+# One-off backfills of data written before a feature existed, by name
+BACKFILLS = {
+    "messageIndex": backfill_index_keys,
+    "engagementStats": backfill_engagement_stats,
+    "materialStats": backfill_material_stats,
+}
+
+def lambda_handler(event, context):
+    """
+    Runs one backfill, invoked manually with {"backfill": "<name>"}. A backfill that runs out of time
+    returns a resumeKey, invoke again with {"backfill": "<name>", "resumeKey": <resumeKey>} until it is null.
+    """
+    name = event.get("backfill")
+    backfill = BACKFILLS.get(name)
+    if backfill is None:
+        return construct_response(400, {"error": f"Unknown backfill: {name}, expected one of {list(BACKFILLS)}"})
+
+    def should_stop():
+        return context is not None and context.get_remaining_time_in_millis() < STOP_MARGIN_MILLIS
+
+    try:
+        updated, resume_key = backfill(event.get("resumeKey"), should_stop)
+    except Exception as e:
+        print(f"Error running backfill {name}: {e}")
+        return construct_response(500, {"error": f"Backfill {name} failed"})
+    return construct_response(200, {"backfill": name, "updated": updated, "resumeKey": resume_key})
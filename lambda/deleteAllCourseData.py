@@ -1,7 +1,7 @@
 import json
 import psycopg2
 import psycopg2.extras
-from utils.get_rds_secret import get_secret, load_db_config
+from utils.db_connection import transaction
 from utils.construct_response import construct_response
 
 
@@ -11,47 +11,27 @@ def lambda_handler(event, context):
     # Validate required fields
     if not course_id:
         return construct_response(400, {"error": "Missing required fields: 'course' is required"})
-    
-    secret = get_secret()
-    credentials = json.loads(secret)
-    username = credentials['username']
-    password = credentials['password']
-    # Database connection parameters
-    static_db_config = load_db_config()
-    # Combine static DB config and dynamic credentials
-    DB_CONFIG = {
-        **static_db_config,
-        "user": username,
-        "password": password
-    }
-    delete_result = delete_all_from_this_course(DB_CONFIG, course_id)
+    delete_result = delete_all_from_this_course(course_id)
 
     return construct_response(200, {"delete result": delete_result})
 
-def delete_all_from_this_course(DB_CONFIG, course_id):
-    # Connect to the PostgreSQL database
+def delete_all_from_this_course(course_id):
     try:
-        # Connect to the PostgreSQL database
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-
         # Delete query
         delete_query1 = f"""
-        DROP TABLE IF EXISTS course_vectors_{course_id};
+        DROP TABLE IF EXISTS course_vectors_{course_id}, course_vectors_{course_id}_shadow;
         """
         delete_query2 = """
         DELETE FROM course_configuration
         WHERE course_id = %s
         """
-        cursor.execute(delete_query1)
-        vectors_deleted = cursor.rowcount
-        cursor.execute(delete_query2, (course_id,))
-        configs_deleted = cursor.rowcount
+        # Both statements run in one transaction
+        with transaction() as cursor:
+            cursor.execute(delete_query1)
+            vectors_deleted = cursor.rowcount
+            cursor.execute(delete_query2, (course_id,))
+            configs_deleted = cursor.rowcount
 
-        # Commit the transaction
-        connection.commit()
-        cursor.close()
-        connection.close()
         print("All vectors from this course deleted!")
         print("deleted vectors: ", vectors_deleted)
         print("deleted configs: ", configs_deleted)
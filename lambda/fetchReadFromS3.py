@@ -6,19 +6,52 @@ import fitz  # so we can also get metadata or do direct PyMuPDF calls if needed
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import docx
 from bs4 import BeautifulSoup # For HTML
-import psycopg2
-from datetime import datetime
-import psycopg2.extras
 import utils.get_canvas_secret
 import utils.get_course_related_stuff
-from utils.get_rds_secret import get_secret, load_db_config
-from utils.create_course_vectors_tables import create_table_if_not_exists
+from utils.db_connection import get_connection, POOL_MAX_CONNECTIONS
+from utils.create_course_vectors_tables import (
+    create_table_if_not_exists, maintain_vector_index, create_shadow_table, swap_shadow_table, drop_shadow_table
+)
 from utils.retrieve_course_config import retrieve_course_config
 from utils.construct_response import construct_response
+from utils.embedding_cache import create_embedding_cache_table, embed_chunks_with_cache, seed_embedding_cache, \
+    expire_embedding_cache
+from utils.store_course_vectors import (
+    compute_content_hash, store_embeddings, get_stored_content_hashes, has_document_vectors,
+    prune_document_vectors, delete_document_vectors, copy_document_vectors
+)
+from utils.ingestion_fanout import plan_work_units, CompletionTracker, LambdaWorkerExecutor
+from utils.course_manifest import load_course_manifest, list_course_object_keys, get_file_metadata
 from io import BytesIO
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 s3_client = boto3.client("s3")
-bedrock = boto3.client("bedrock-runtime", region_name = os.getenv('AWS_REGION'))
+
+# PyMuPDF is not thread-safe, every fitz call of the file workers goes through this lock.
+# Downloads, splitting and embedding still run in parallel
+FITZ_LOCK = threading.Lock()
+
+# PDFs are spooled here instead of being read into memory
+SPOOL_DIR = "/tmp"
+# Chunks embedded and stored together, bounds the memory used per document
+EMBED_BATCH_SIZE = 64
+# Files read, embedded and stored at the same time. Each holds at most one batch and one spooled PDF.
+# Every worker borrows a pooled connection while the handler keeps its own, so one slot is left for the handler
+MAX_FILE_WORKERS = max(1, min(int(os.environ.get("MAX_FILE_WORKERS", 4)), POOL_MAX_CONNECTIONS - 1))
+# Courses with at least this many files to read are ingested by parallel worker invocations
+FANOUT_MIN_FILES = int(os.environ.get("FANOUT_MIN_FILES", 50))
+
+# Canvas content ingested besides files: (config key, document name, course URL path, fetcher)
+CANVAS_CONTENT_SOURCES = [
+    ("SYLLABUS", "Syllabus", "assignments/syllabus", utils.get_course_related_stuff.fetch_syllabus_from_canvas),
+    ("ANNOUNCEMENTS", "Announcements", "announcements", utils.get_course_related_stuff.fetch_announcments_from_canvas),
+    ("ASSIGNMENTS", "Assignments", "assignments", utils.get_course_related_stuff.fetch_assignments_from_canvas),
+    ("QUIZZES", "Quizzes", "quizzes", utils.get_course_related_stuff.fetch_quizzes_from_canvas),
+    ("DISCUSSIONS", "Discussions", "discussion_topics", utils.get_course_related_stuff.fetch_discussions_from_canvas),
+    ("PAGES", "Pages", "pages", utils.get_course_related_stuff.fetch_pages_from_canvas),
+]
 
 def lambda_handler(event, context):
     env_prefix = os.environ.get("ENV_PREFIX")
@@ -29,189 +62,298 @@ def lambda_handler(event, context):
         chunk_overlap=100
     )
 
+    # Work units of a fanned out ingestion carry their own parameters
+    worker = event.get("worker")
     params = event.get("queryStringParameters", {})
-    course_id = params.get("course")
+    course_id = worker["course"] if worker else params.get("course")
 
     if not course_id:
         return construct_response(400, {"error": "Missing required fields: 'course' is required"})
     
-    secret = get_secret()
-    credentials = json.loads(secret)
-    username = credentials['username']
-    password = credentials['password']
-    # Database connection parameters
-    static_db_config = load_db_config()
-    # Combine static DB config and dynamic credentials
-    DB_CONFIG = {
-        **static_db_config,
-        "user": username,
-        "password": password
-    }
-
-    create_table_if_not_exists(DB_CONFIG, course_id)
-
+    if not worker:
+        create_table_if_not_exists(course_id)
+    # One pooled connection is used for the run's own statements, file workers borrow their own
+    with get_connection() as connection:
+        create_embedding_cache_table(connection)
+        if worker:
+            return run_work_unit(worker, bucket_name, text_splitter, connection)
+        return ingest_course(course_id, bucket_name, text_splitter, connection, event.get("sync"))
+
+def ingest_course(course_id, bucket_name, text_splitter, connection, sync=None, executor=None):
+    """
+    Reads, embeds and stores every enabled content type of the course.
+    Without sync the whole course folder is ingested into a shadow table that replaces the live table
+    at the end, so retrieval never sees a partially built course.
+    With sync = {"changedKeys": [...], "removedKeys": [...]} only those files are re-read or removed,
+    in place, while the vectors of every other file stay untouched.
+    Courses with at least FANOUT_MIN_FILES files to read are split into work units run by parallel
+    invocations of this function, or by the given executor.
+    """
     ## first check course config settings
     course_config = retrieve_course_config(course_id)
 
     if isinstance(course_config, str):  # If there's an error message
         print("Error:", course_config)
         return construct_response(500, {"error": "Error retrieving course configuration"})
-    
-    # Access fields in the dictionary
-    files_enabled = course_config["selectedIncludedCourseContent"].get("FILES", False)
-    syllabus_enabled = course_config["selectedIncludedCourseContent"].get("SYLLABUS", False)
-    announcements_enabled = course_config["selectedIncludedCourseContent"].get("ANNOUNCEMENTS", False)
-    assignments_enabled = course_config["selectedIncludedCourseContent"].get("ASSIGNMENTS", False)
-    quizzes_enabled = course_config["selectedIncludedCourseContent"].get("QUIZZES", False)
-    discussions_enabled = course_config["selectedIncludedCourseContent"].get("DISCUSSIONS", False)
-    pages_enabled = course_config["selectedIncludedCourseContent"].get("PAGES", False)
-    
-    prefix = f"{course_id}/"  # Assuming course_id is used as a folder structure
-    response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-    
-    files_metadata = []
-    results = {}
-    embeddings = []
-
-    if "Contents" in response and files_enabled:
-        for obj in response["Contents"]:
-            file_key = obj["Key"]
-
-            # Fetch file metadata
-            metadata_response = s3_client.head_object(Bucket=bucket_name, Key=file_key)
-            metadata = metadata_response.get("Metadata", {})
-
-            files_metadata.append({
-                "file_key": file_key,
-                "s3_url": f"s3://{bucket_name}/{file_key}",
-                "original_url": metadata.get("original_url", "N/A"),
-                "display_name": metadata.get("display_name", "N/A"),
-                "updated_at": metadata.get("updated_at", "N/A"),
-            })
-
-            # Process file based on type (without downloading)
-            if file_key.lower().endswith(".pdf"):
-                results[file_key] = read_pdf_streaming(bucket_name, file_key, text_splitter)
-            elif file_key.lower().endswith(".docx"):
-                results[file_key] = read_docx_streaming(bucket_name, file_key, text_splitter)
-            elif file_key.lower().endswith(".html"):
-                results[file_key] = read_html_streaming(bucket_name, file_key, text_splitter)
-            elif file_key.lower().endswith((".txt", ".md", ".c", ".cpp", ".css", ".go", ".py", ".js", ".rtf")):
-                # print("filekey: ", file_key.lower())
-                results[file_key] = read_text_streaming(bucket_name, file_key, text_splitter)
-                # print("results: ", results[file_key])
-            else:
-                print(f"Unsupported file type: {file_key}")
-
-            document_embeddings = []
-            for chunk in results[file_key]:
-                # print(f"Storing chunk: {chunk}...")  
-                file_name_db = metadata.get("display_name", file_key)
-                chunk = chunk
-                chunk_embeddings = generate_embeddings(chunk)  # Assuming `generate_embeddings` calls your embedding model
-                if chunk_embeddings:
-                    document_embeddings.append(chunk_embeddings)
-                    source_url = metadata.get("original_url", "N/A"),
-                    store_embeddings(file_name_db, chunk_embeddings, course_id, DB_CONFIG, source_url, chunk)
-            embeddings.append({file_key: document_embeddings})
+
+    included_content = course_config["selectedIncludedCourseContent"]
+    files_enabled = included_content.get("FILES", False)
+
+    if sync is not None and not has_document_vectors(connection, course_id):
+        # Nothing to update incrementally, e.g. the vectors were deleted since the last sync
+        print(f"No keyed vectors for course {course_id}, running a full sync")
+        sync = None
+    incremental = sync is not None
+
+    if incremental:
+        table_id = course_id
+    else:
+        # Chunks of the live generation are served from the embedding cache instead of Bedrock
+        seed_embedding_cache(connection, course_id)
+        table_id = create_shadow_table(connection, course_id)
+        if table_id is None:
+            return construct_response(500, {"error": "Error creating shadow table"})
+
+    run_state = {
+        "failed_documents": [],
+        "changed_rows": 0,
+    }
+
+    # File metadata recorded by refreshContent at upload time
+    manifest = load_course_manifest(bucket_name, course_id) if files_enabled else None
+    file_metadata = manifest.get("files", {}) if manifest else {}
+
+    if incremental:
+        if files_enabled:
+            file_keys = sync.get("changedKeys", [])
+            run_state["changed_rows"] += delete_document_vectors(connection, table_id, sync.get("removedKeys", []))
+        else:
+            file_keys = []
+            run_state["changed_rows"] += delete_document_vectors(connection, table_id, key_prefix=f"{course_id}/")
+    elif files_enabled:
+        file_keys = list_course_object_keys(bucket_name, course_id)
+        if file_keys is None:
+            drop_shadow_table(connection, course_id)
+            return construct_response(500, {"error": "Error listing course files"})
+    else:
+        file_keys = []
 
     # add canvas contents based on instructor configuration
+    canvas_content_types = []
+    for content_type, _, _, _ in CANVAS_CONTENT_SOURCES:
+        if included_content.get(content_type, False):
+            canvas_content_types.append(content_type)
+        elif incremental:
+            run_state["changed_rows"] += delete_document_vectors(connection, table_id, [f"canvas:{content_type}"])
+
+    if executor is None and len(file_keys) >= FANOUT_MIN_FILES:
+        executor = LambdaWorkerExecutor(f"{os.environ.get('ENV_PREFIX')}FetchReadFromS3Function")
+    if executor is not None:
+        # Coordinator: every work unit runs in parallel and reports to the tracker, the swap waits for all of them
+        canvas_document_names = {content_type: name for content_type, name, _, _ in CANVAS_CONTENT_SOURCES}
+        units = plan_work_units(file_keys, canvas_content_types, file_metadata, canvas_document_names)
+        print(f"Fanning out ingestion of course {course_id} into {len(units)} work units")
+        tracker = CompletionTracker(units)
+        executor.run(units, {"course": course_id, "tableId": table_id, "incremental": incremental}, tracker)
+        run_state["failed_documents"].extend(tracker.failed_documents())
+        run_state["changed_rows"] += tracker.changed_rows()
+    else:
+        ingest_documents(course_id, table_id, file_keys, canvas_content_types, bucket_name, text_splitter,
+                         connection, run_state, incremental, file_metadata)
+
+    if incremental:
+        # Build or refresh the ANN index when the table content changed
+        if run_state["changed_rows"]:
+            maintain_vector_index(connection, course_id)
+        return construct_response(200, {"message": "success", "mode": "incremental"})
+
+    # Documents that could not be read this time keep the chunks of the previous generation
+    if run_state["failed_documents"]:
+        print(f"{len(run_state['failed_documents'])} documents could not be read, keeping their previous vectors")
+        copy_document_vectors(connection, course_id, table_id, run_state["failed_documents"])
+
+    maintain_vector_index(connection, table_id)
+    if swap_shadow_table(connection, course_id) is None:
+        drop_shadow_table(connection, course_id)
+        return construct_response(500, {"error": "Error swapping in the refreshed course vectors"})
+    # Seeded and newly embedded entries are kept for CACHE_MAX_AGE_DAYS, which bounds the shared cache
+    expire_embedding_cache(connection)
+
+    # 4. Return the results
+    return construct_response(200, {"message": "success", "mode": "full"})
+
+def run_work_unit(unit, bucket_name, text_splitter, connection):
+    """
+    Worker side of a fanned out ingestion: ingests the unit's files and Canvas content types into
+    course_vectors_{tableId} and reports the documents that failed and the rows changed.
+    """
+    run_state = {
+        "failed_documents": [],
+        "changed_rows": 0,
+    }
+    ingest_documents(unit["course"], unit["tableId"], unit["fileKeys"], unit["canvasContentTypes"], bucket_name,
+                     text_splitter, connection, run_state, unit["incremental"], unit.get("fileMetadata"))
+    return construct_response(200, {
+        "unitId": unit["unitId"],
+        "failedDocuments": run_state["failed_documents"],
+        "changedRows": run_state["changed_rows"],
+    })
+
+def ingest_documents(course_id, table_id, file_keys, canvas_content_types, bucket_name, text_splitter,
+                     connection, run_state, incremental=False, file_metadata=None):
+    """
+    Reads, embeds and stores the given course files and Canvas content types into course_vectors_{table_id},
+    adding the documents that failed and the rows changed to run_state.
+    file_metadata maps S3 keys to their manifest entry, files missing from it fall back to a HEAD request.
+    """
+    # Chunks already stored in the target table are not embedded again. A changed document may contain
+    # chunks stored under another document, those are re-keyed to it
+    document_keys = file_keys + [f"canvas:{content_type}" for content_type in canvas_content_types]
+    run_state["stored_hashes"] = get_stored_content_hashes(connection, table_id, document_keys) if incremental else set()
+
+    for file_state in process_files(file_keys, bucket_name, text_splitter, table_id, run_state, incremental, file_metadata):
+        run_state["failed_documents"].extend(file_state["failed_documents"])
+        run_state["changed_rows"] += file_state["changed_rows"]
+
+    if not canvas_content_types:
+        return run_state
     canvas_secret = utils.get_canvas_secret.get_secret()
     canvas_credentials = json.loads(canvas_secret)
     BASE_URL = canvas_credentials['baseURL']
     TOKEN = canvas_credentials['adminAccessToken']
-    if syllabus_enabled:
-        syllabus_url = f"{BASE_URL}/courses/{course_id}/assignments/syllabus"
-        syllabus_text = utils.get_course_related_stuff.fetch_syllabus_from_canvas(TOKEN, BASE_URL, course_id)
-        if syllabus_text:
-            syllabus_chunks = text_splitter.split_text(syllabus_text)
-            embeddings = []
-            for chunk in syllabus_chunks:
-                embedding = generate_embeddings(chunk)
-                if embedding:
-                    embeddings.append(embedding)
-                    store_embeddings("Syllabus", embedding, course_id, DB_CONFIG, syllabus_url, chunk)
-
-    if announcements_enabled:
-        announcements_url = f"{BASE_URL}/courses/{course_id}/announcements"
-        announcements_text = utils.get_course_related_stuff.fetch_announcments_from_canvas(TOKEN, BASE_URL, course_id)
-        if announcements_text:
-            announcements_chunks = text_splitter.split_text(announcements_text)
-            embeddings = []
-            for chunk in announcements_chunks:
-                embedding = generate_embeddings(chunk)
-                if embedding:
-                    embeddings.append(embedding)
-                    store_embeddings("Announcements", embedding, course_id, DB_CONFIG, announcements_url, chunk)
-
-    if assignments_enabled:
-        assignments_url = f"{BASE_URL}/courses/{course_id}/assignments"
-        assignments_text = utils.get_course_related_stuff.fetch_assignments_from_canvas(TOKEN, BASE_URL, course_id)
-        if assignments_text:
-            assignments_chunks = text_splitter.split_text(assignments_text)
-            embeddings = []
-            for chunk in assignments_chunks:
-                embedding = generate_embeddings(chunk)
-                if embedding:
-                    embeddings.append(embedding)
-                    store_embeddings("Assignments", embedding, course_id, DB_CONFIG, assignments_url, chunk)
-
-    if quizzes_enabled:
-        quizzes_url = f"{BASE_URL}/courses/{course_id}/quizzes"
-        quizzes_text = utils.get_course_related_stuff.fetch_quizzes_from_canvas(TOKEN, BASE_URL, course_id)
-        if quizzes_text:
-            quizzes_chunks = text_splitter.split_text(quizzes_text)
-            embeddings = []
-            for chunk in quizzes_chunks:
-                embedding = generate_embeddings(chunk)
-                if embedding:
-                    embeddings.append(embedding)
-                    store_embeddings("Quizzes", embedding, course_id, DB_CONFIG, quizzes_url, chunk)
-
-    if discussions_enabled:
-        discussions_url = f"{BASE_URL}/courses/{course_id}/discussion_topics"
-        discussions_text = utils.get_course_related_stuff.fetch_discussions_from_canvas(TOKEN, BASE_URL, course_id)
-        if discussions_text:
-            discussions_chunks = text_splitter.split_text(discussions_text)
-            embeddings = []
-            for chunk in discussions_chunks:
-                embedding = generate_embeddings(chunk)
-                if embedding:
-                    embeddings.append(embedding)
-                    store_embeddings("Discussions", embedding, course_id, DB_CONFIG, discussions_url, chunk)
-
-    if pages_enabled:
-        pages_url = f"{BASE_URL}/courses/{course_id}/pages"
-        pages_text = utils.get_course_related_stuff.fetch_pages_from_canvas(TOKEN, BASE_URL, course_id)
-        if pages_text:
-            pages_chunks = text_splitter.split_text(pages_text)
-            embeddings = []
-            for chunk in pages_chunks:
-                embedding = generate_embeddings(chunk)
-                if embedding:
-                    embeddings.append(embedding)
-                    store_embeddings("Pages", embedding, course_id, DB_CONFIG, pages_url, chunk)
+    for content_type, document_name, url_path, fetch_content in CANVAS_CONTENT_SOURCES:
+        if content_type not in canvas_content_types:
+            continue
+        document_key = f"canvas:{content_type}"
+        content_url = f"{BASE_URL}/courses/{course_id}/{url_path}"
+        try:
+            content_text = fetch_content(TOKEN, BASE_URL, course_id)
+        except Exception as e:
+            print(f"Error fetching {document_name} from Canvas: {str(e)}")
+            content_text = None
+        if not content_text:
+            # The fetchers return None on a failed request, the previous vectors are kept rather than pruned
+            print(f"No {document_name} fetched from Canvas, keeping its previous vectors")
+            run_state["failed_documents"].append((document_key, document_name))
+            continue
+        content_chunks = with_page_numbers(text_splitter.split_text(content_text))
+        embed_and_store(document_key, document_name, content_chunks, table_id, connection, content_url, run_state, incremental)
+    return run_state
+
+def process_files(file_keys, bucket_name, text_splitter, course_id, run_state, incremental=False,
+                  file_metadata=None, max_workers=MAX_FILE_WORKERS):
+    """
+    Reads, embeds and stores the given files on a pool of threads, each file on its own pooled connection.
+    Yields one result per file, in the order of file_keys, with the documents that failed and the rows changed.
+    A file that fails is reported in its result without affecting the others.
+    """
+    if not file_keys:
+        return
+
+    def process(file_key):
+        # stored_hashes is only read while files are processed, so it is shared between workers
+        file_state = {
+            "stored_hashes": run_state["stored_hashes"],
+            "failed_documents": [],
+            "changed_rows": 0,
+        }
+        file_name_db = file_key
+        try:
+            chunks = read_file_chunks(bucket_name, file_key, text_splitter)
+            if chunks is None:
+                return file_state
+
+            metadata = get_file_metadata(bucket_name, file_key, file_metadata)
+            file_name_db = metadata["display_name"]
+            source_url = metadata["original_url"]
+            with get_connection() as connection:
+                embed_and_store(file_key, file_name_db, chunks, course_id, connection, source_url, file_state, incremental)
+        except Exception as e:
+            print(f"Error processing {file_key}: {str(e)}")
+            file_state["failed_documents"].append((file_key, file_name_db))
+        return file_state
+
+    max_workers = max(1, min(max_workers, POOL_MAX_CONNECTIONS - 1, len(file_keys)))
+    # Embedding calls of every file share one adaptive limiter, so more files do not mean more Bedrock load
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(process, file_keys)
+
+def with_page_numbers(chunks, page_number=None):
+    """
+    Pairs a reader's chunks with a page number, passing error messages through.
+    """
+    if not isinstance(chunks, list):
+        return chunks
+    return [(chunk, page_number) for chunk in chunks]
+
+def read_file_chunks(bucket_name, file_key, text_splitter):
+    """
+    Reads and splits one course file based on its type into (chunk, page_number) pairs.
+    Returns None for unsupported file types, or the reader's error message if parsing failed.
+    """
+    if file_key.lower().endswith(".pdf"):
+        return read_pdf_streaming(bucket_name, file_key, text_splitter)
+    elif file_key.lower().endswith(".docx"):
+        chunks = read_docx_streaming(bucket_name, file_key, text_splitter)
+    elif file_key.lower().endswith(".html"):
+        chunks = read_html_streaming(bucket_name, file_key, text_splitter)
+    elif file_key.lower().endswith((".txt", ".md", ".c", ".cpp", ".css", ".go", ".py", ".js", ".rtf")):
+        chunks = read_text_streaming(bucket_name, file_key, text_splitter)
+    else:
+        print(f"Unsupported file type: {file_key}")
+        return None
+    # Only PDFs have pages
+    return with_page_numbers(chunks)
 
-    # 4. Return the results
-    return construct_response(200, {"message": "success"})
-    
 def read_pdf_streaming(bucket_name, file_key, text_splitter):
-    """Extract text from a large PDF file using S3 streaming."""
-    response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-    file_stream = BytesIO(response["Body"].read())  # Read as BytesIO for PyMuPDF
-    
-    try:
-        doc = fitz.open(stream=file_stream, filetype="pdf")  # Open PDF in memory
-        extracted_text = []
-        
-        for page in doc:
-            text = page.get_text("text")
-            extracted_text.append(text)
-        
-        chunks = text_splitter.split_text("\n\n".join(extracted_text))
-        return chunks
-    except Exception as e:
-        return f"Error processing PDF: {str(e)}"
+    """
+    Extract text from a PDF page by page. The object is spooled to /tmp instead of memory and PyMuPDF
+    loads pages from the file on demand, so only the current page is held in memory.
+    Yields (chunk, page_number) pairs lazily.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdf", dir=SPOOL_DIR) as spool:
+        s3_client.download_fileobj(bucket_name, file_key, spool)
+        spool.flush()
+        with FITZ_LOCK:
+            doc = fitz.open(spool.name)
+        try:
+            yield from split_pages(read_pdf_pages(doc), text_splitter)
+        finally:
+            with FITZ_LOCK:
+                doc.close()
+
+def read_pdf_pages(doc):
+    """
+    Yields (page_number, text) for each page of an open PDF, holding FITZ_LOCK only while a page is parsed.
+    """
+    with FITZ_LOCK:
+        page_count = doc.page_count
+    for page_index in range(page_count):
+        with FITZ_LOCK:
+            page_text = doc.load_page(page_index).get_text("text")
+        yield page_index + 1, page_text
+
+def split_pages(pages, text_splitter):
+    """
+    Incrementally splits (page_number, text) pairs into (chunk, page_number) pairs, where page_number is
+    the page a chunk starts on. Only the current page and the unfinished last chunk are kept in memory.
+    """
+    carry, carry_page = "", None
+    for page_number, page_text in pages:
+        if not page_text.strip():
+            continue
+        text = f"{carry}\n\n{page_text}" if carry else page_text
+        chunks = text_splitter.split_text(text)
+        if not chunks:
+            continue
+        for i, chunk in enumerate(chunks[:-1]):
+            yield chunk, carry_page if (i == 0 and carry) else page_number
+        # The last chunk may still grow with the next page
+        if not (carry and len(chunks) == 1):
+            carry_page = page_number
+        carry = chunks[-1]
+    if carry:
+        yield carry, carry_page
 
 def read_docx_streaming(bucket_name, file_key, text_splitter):
     """Extract text from a large DOCX file using S3 streaming."""
@@ -268,73 +410,61 @@ def read_text_streaming(bucket_name, file_key, text_splitter):
     except Exception as e:
         return f"Error processing text file: {str(e)}"
 
-def generate_embeddings(chunk):
-    model_id = "amazon.titan-embed-text-v2:0"  # Or whatever the correct model ID
-    accept = "application/json"
-    content_type = "application/json"
-
-    # The Bedrock model likely expects 'inputText' or similarly named key
-    payload = {
-        "inputText": chunk
-    }
-
-    json_payload = json.dumps(payload)
-
-    try:
-        response = bedrock.invoke_model(
-            modelId=model_id,
-            body=json_payload,
-            contentType=content_type,
-            accept=accept
-        )
-
-        # Bedrock returns a streaming response; parse the body
-        response_body = json.loads(response["body"].read().decode("utf-8"))
-
-        # Titan embedding typically returns an 'embedding' field
-        embedding = response_body.get("embedding")
-        return embedding
-
-    except Exception as e:
-        print(f"Error invoking model: {str(e)}")
-        return None
-
-def store_embeddings(document_name, embeddings, course_id, DB_CONFIG, source_url, document_content):
+def embed_and_store(document_key, document_name, chunks, course_id, connection, source_url, run_state, incremental=False):
     """
-    Store embeddings into the PostgreSQL database only if the document content is unique.
+    Stores the (chunk, page_number) pairs of one document into course_vectors_{course_id}. Chunks are consumed
+    lazily and handled in batches: those already in the table are skipped, the rest are embedded in parallel
+    (through the embedding cache) and bulk stored.
+    In an incremental sync the document's chunks that are gone are deleted once it has been read in full.
     """
-    connection = None
+    if isinstance(chunks, str):
+        # The readers return an error message instead of chunks when parsing fails
+        print(f"Skipping {document_name}: {chunks}")
+        run_state["failed_documents"].append((document_key, document_name))
+        return 0
+
+    content_hashes = []
+    batch = []
+    stored = 0
     try:
-        # Connect to the PostgreSQL database
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-
-        # Check if the document content already exists in the table
-        check_query = f"""
-        SELECT COUNT(*) FROM course_vectors_{course_id} WHERE document_content = %s;
-        """
-        cursor.execute(check_query, (document_content,))
-        result = cursor.fetchone()
-
-        if result and result[0] > 0:
-            print("Duplicate content detected. Skipping insertion.", document_content[:50])
-            return "Duplicate content detected. Skipping insertion."
-
-        # If no duplicate is found, insert the new record
-        insert_query = f"""
-        INSERT INTO course_vectors_{course_id} (document_name, embeddings, created_at, sourceURL, document_content)
-        VALUES (%s, %s, %s, %s, %s);
-        """
-        cursor.execute(insert_query, (document_name, embeddings, datetime.now(), source_url, document_content))
-        
-        # Commit the transaction
-        connection.commit()
-        cursor.close()
-        print("SQL SUCCESS: Embedding stored successfully")
-        return "Embedding stored successfully"
+        for chunk, page_number in chunks:
+            content_hash = compute_content_hash(chunk)
+            content_hashes.append(content_hash)
+            if content_hash not in run_state["stored_hashes"]:
+                batch.append((chunk, page_number))
+            if len(batch) >= EMBED_BATCH_SIZE:
+                stored += embed_and_store_batch(document_key, document_name, batch, course_id, connection, source_url)
+                batch = []
+        stored += embed_and_store_batch(document_key, document_name, batch, course_id, connection, source_url)
     except Exception as e:
-        print(f"Error inserting embeddings: {e}")
-        return "Error storing embeddings"
-    finally:
-        if connection:
-            connection.close()
\ No newline at end of file
+        # Chunks stored so far are kept, the rest of the document keeps its previous vectors
+        print(f"Error reading {document_name}: {str(e)}")
+        run_state["failed_documents"].append((document_key, document_name))
+        run_state["changed_rows"] += stored
+        return stored
+
+    # An empty read is not proof that the document is empty, its previous chunks are only pruned after a real read
+    if incremental and content_hashes:
+        run_state["changed_rows"] += prune_document_vectors(connection, course_id, document_key, content_hashes)
+    if not stored:
+        print(f"{document_name} is unchanged, nothing to embed")
+    run_state["changed_rows"] += stored
+    return stored
+
+def embed_and_store_batch(document_key, document_name, batch, course_id, connection, source_url):
+    """
+    Embeds and stores one batch of (chunk, page_number) pairs. Returns the number of rows written.
+    """
+    if not batch:
+        return 0
+    chunk_embeddings = embed_chunks_with_cache(connection, [chunk for chunk, _ in batch])
+    rows = [
+        (document_key, document_name, embedding, source_url, chunk, page_number)
+        for (chunk, page_number), embedding in zip(batch, chunk_embeddings)
+        if embedding
+    ]
+
+    failed = len(batch) - len(rows)
+    if failed:
+        print(f"Failed to embed {failed} of {len(batch)} chunks for {document_name}")
+    return store_embeddings(connection, course_id, rows)
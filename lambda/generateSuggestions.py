@@ -4,10 +4,9 @@ import boto3
 import re
 from utils.get_user_info import get_user_info
 from utils.get_course_related_stuff import call_course_activity_stream
-from utils.retrieve_course_config import call_get_course_config
+from utils.chat_engine import complete, get_course_system_prompt
 from utils.construct_response import construct_response
 
-lambda_client = boto3.client('lambda')
 env_prefix = os.environ.get("ENV_PREFIX")
 translate_client = boto3.client("translate", region_name=os.getenv('AWS_REGION'))
 
@@ -42,8 +41,7 @@ def lambda_handler(event, context):
         
         student_language_pref = user_info.get("preferred_language","")
 
-        response = call_get_course_config(auth_token, course_id, lambda_client)
-        course_config_prompt = response.get("systemPrompt", {})
+        course_config_prompt = get_course_system_prompt(auth_token, course_id) or ""
         recentCourseRelated_stuff = call_course_activity_stream(auth_token, course_id)
         suggested_questions = generate_questions_with_retries(course_config_prompt, str(num_suggests), recentCourseRelated_stuff, course_id, student_language_pref)
 
@@ -73,21 +71,7 @@ def generate_suggestions(course_config_str, num_suggestions, course_related_stuf
         <|eot_id|>
         <|start_header_id|>assistant<|end_header_id|>
         """
-    payload = {
-        "body": json.dumps({"message": formatted_prompt, "course": course_id, "language": student_language_pref})
-    }
-    try:
-        response = lambda_client.invoke(
-            FunctionName=f"{env_prefix}InvokeLLMCompletionLambda",  # Replace with actual function name
-            InvocationType="RequestResponse",  # Use 'Event' for async calls
-            Payload=json.dumps(payload)
-        )
-        response_payload = json.loads(response["Payload"].read().decode("utf-8"))
-        body_dict = json.loads(response_payload["body"])
-        return body_dict
-    except Exception as e:
-        print(f"Error invoking Lambda function: {e}")
-        return None
+    return complete(formatted_prompt, course_id, student_language_pref=student_language_pref)
 
 
 def flatten_list(nested_list):
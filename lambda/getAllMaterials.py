@@ -1,6 +1,6 @@
 import psycopg2
 import psycopg2.extras
-from utils.get_rds_secret import get_cached_secret, load_db_config
+from utils.db_connection import transaction
 from utils.get_user_info import get_user_info
 from utils.construct_response import construct_response
 
@@ -23,34 +23,17 @@ def lambda_handler(event, context):
         course_id = event.get("queryStringParameters", {}).get("course")
         if not course_id:
             return construct_response(400, {"error": "Missing required parameter: 'course' is required"})
-        # Get database credentials
-        credentials = get_cached_secret()
-        username = credentials['username']
-        password = credentials['password']
-        static_db_config = load_db_config()
-        # Combine static DB config and dynamic credentials
-        DB_CONFIG = {
-            **static_db_config,
-            "user": username,
-            "password": password
-        }
-
-        DB_CONNECTION = psycopg2.connect(**DB_CONFIG)
-
         documents = []
 
-        # Connect to the PostgreSQL database
-        DB_CONNECTION = psycopg2.connect(**DB_CONFIG)
-        cursor = DB_CONNECTION.cursor()
-
         # Construct query to get document names and URLs
         query = f"""
         SELECT document_name, sourceURL
         FROM course_vectors_{course_id};
         """
         
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        with transaction() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
 
         # Use a set to get unique pairs of document_name and source_url
         unique_documents = {
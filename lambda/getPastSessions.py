@@ -4,6 +4,7 @@ import re
 import boto3
 from utils.get_user_info import get_user_info
 from utils.construct_response import construct_response
+from utils.message_hydration import hydrate_messages
 from utils.scan_all_conversations import scan_all_conversations_by_student
 
 DEBUG = True
@@ -15,7 +16,6 @@ bedrock = session.client('bedrock-runtime', region_name=os.getenv('AWS_REGION'))
 env_prefix = os.environ.get("ENV_PREFIX")
 dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
 conversations_table = dynamodb.Table(f"{env_prefix}Conversations")   # Replace with your table name
-messages_table = dynamodb.Table(f"{env_prefix}Messages")
 
 def lambda_handler(event, context):
     try:
@@ -95,18 +95,11 @@ def generate_summary_input(message_ids_list):
     """
     Calls an AI service to generate a session summary for a conversation.
     """
-    messages = []
-
-    for message_id in message_ids_list:
-        message = messages_table.get_item(Key={"message_id": message_id})
-        if "Item" in message:
-            messages.append(message["Item"])
+    messages = hydrate_messages(message_ids_list)
     
     if DEBUG:
         print(f"Fetched {len(messages)} messages for summary generation.")
 
-    # Sort messages by timestamp
-    messages.sort(key=lambda x: x.get("timestamp", ""))
     conversation_hist = ""
 
     for message in messages:
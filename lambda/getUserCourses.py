@@ -1,6 +1,5 @@
 import json
-import psycopg2
-import utils.get_rds_secret
+from utils.course_availability import get_availabilities
 from utils.construct_response import construct_response
 from utils.canvas_api_calls import get_student_courses, get_instructor_courses
 
@@ -21,24 +20,25 @@ def lambda_handler(event, context):
     if courses_as_instructor is None:
         return construct_response(500, {"error": "Failed to fetch instructor courses from Canvas"})
     
+    available_student_courses = [course for course in courses_as_students if course["workflow_state"] == "available"]
+    # check course availability in db, for all courses at once
+    availabilities = get_availabilities([course["id"] for course in available_student_courses])
+
     availableStudentList = []
     availableInstructorList = []
     unavailableStudentList = []
-    for course in courses_as_students:
+    for course in available_student_courses:
         # construct object
-        if course["workflow_state"] == "available":
-            cur_course = {
-                "id": course["id"],
-                "courseCode": course["course_code"],
-                "name": course["name"]
-            }
-            # check course availability in db
-            available = get_availability(course["id"])
-            # add into its corresponding list
-            if available:
-                availableStudentList.append(cur_course)
-            else:
-                unavailableStudentList.append(cur_course)
+        cur_course = {
+            "id": course["id"],
+            "courseCode": course["course_code"],
+            "name": course["name"]
+        }
+        # add into its corresponding list
+        if availabilities[str(course["id"])]:
+            availableStudentList.append(cur_course)
+        else:
+            unavailableStudentList.append(cur_course)
 
     for course in courses_as_instructor:
         # construct object
@@ -58,41 +58,3 @@ def lambda_handler(event, context):
     }
 
     return construct_response(200, response_body)
-
-def get_availability(course_id):
-    secret = utils.get_rds_secret.get_secret()
-    credentials = json.loads(secret)
-    username = credentials['username']
-    password = credentials['password']
-    static_db_config = utils.get_rds_secret.load_db_config()
-    # Combine static DB config and dynamic credentials
-    DB_CONFIG = {
-        **static_db_config,
-        "user": username,
-        "password": password
-    }
-    try:
-        # Connect to the PostgreSQL database
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-
-        # Query the course configuration
-        query = """
-        SELECT student_access_enabled
-        FROM course_configuration
-        WHERE course_id = %s
-        """
-        cursor.execute(query, (str(course_id),))  # Convert ID to string
-        row = cursor.fetchone()
-
-        if not row:
-            return False
-
-        # Close database connection
-        cursor.close()
-        connection.close()
-
-        return row[0] 
-    except Exception as e:
-        print(f"Error: {e}")
-        return False
\ No newline at end of file
@@ -3,10 +3,9 @@ import json
 import boto3
 import psycopg2
 import psycopg2.extras
-from utils.create_course_vectors_tables import create_table_if_not_exists
-from utils.get_rds_secret import get_secret, load_db_config
+from utils.create_course_vectors_tables import VECTOR_DISTANCE
 from utils.construct_response import construct_response
-from utils.get_course_vector import get_course_vector
+from utils.get_course_vector import get_course_vector, HNSW_EF_SEARCH, IVFFLAT_PROBES
 
 bedrock = boto3.client("bedrock-runtime", region_name = os.getenv('AWS_REGION'))
 
@@ -15,26 +14,20 @@ def lambda_handler(event, context):
     course_id = params.get("course")
     query = params.get("query")
     num_max_results = int(params.get("numMaxResults", 8))  # Default to 8 if not provided
+    # Optional recall knobs for the ANN index. The distance must be the one the index was built with
+    distance = params.get("distance", VECTOR_DISTANCE)
+    ef_search = int(params.get("efSearch", HNSW_EF_SEARCH))
+    probes = int(params.get("probes", IVFFLAT_PROBES))
 
     # Validate required fields
     if not course_id or not query:
         return construct_response(400, {"error": "Missing required fields: 'course' and 'query' are required"})
+    if distance != VECTOR_DISTANCE:
+        return construct_response(400, {"error": f"Unsupported distance: the course index uses '{VECTOR_DISTANCE}'"})
     
-    secret = get_secret()
-    credentials = json.loads(secret)
-    username = credentials['username']
-    password = credentials['password']
-    static_db_config = load_db_config()
-    # Combine static DB config and dynamic credentials
-    DB_CONFIG = {
-        **static_db_config,
-        "user": username,
-        "password": password
-    }
-    
-    create_table_if_not_exists(DB_CONFIG, course_id)
     query_embedding = generate_embeddings(str(query))
-    response_body = get_course_vector(DB_CONFIG, query_embedding, course_id, num_max_results)
+    response_body = get_course_vector(query_embedding, course_id, num_max_results,
+                                      distance=distance, ef_search=ef_search, probes=probes)
 
     return construct_response(200, response_body)
 
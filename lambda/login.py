@@ -1,5 +1,6 @@
 from utils.construct_response import construct_response
 from utils.canvas_api_calls import get_access_token
+from utils.get_user_info import record_token
 
 def lambda_handler(event, context):
     headers = event.get("headers", {})
@@ -20,5 +21,6 @@ def lambda_handler(event, context):
         "refresh_token": canvas_response["refresh_token"],
         "expires_in": canvas_response.get("expires_in", 3600)
     }
+    record_token(response_body["access_token"], response_body["expires_in"], refresh_token=response_body["refresh_token"])
 
     return construct_response(200, response_body)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from utils.construct_response import construct_response
 from utils.canvas_api_calls import log_out
+from utils.get_user_info import invalidate_user_session
 
 def lambda_handler(event, context):
     headers = event.get("headers", {})
@@ -10,6 +11,8 @@ def lambda_handler(event, context):
     if not access_token:
         return construct_response(400, {"error": "Missing required field: 'Authorization' is required"})
     
+    # The token is revoked even if Canvas cannot be reached, it must not authenticate anyone after logout
+    invalidate_user_session(access_token)
     status = log_out(access_token)
     if status is None:
         return construct_response(500, {"error": "Failed to delete access_token from Canvas"})
@@ -2,7 +2,6 @@ import json
 import os
 import boto3
 import utils.get_canvas_secret
-import utils.get_rds_secret
 from utils.retrieve_course_config import call_get_course_config
 from utils.construct_response import construct_response
 from utils.canvas_api_calls import get_all_courses
@@ -20,27 +19,15 @@ def lambda_handler(event, context):
     secret = utils.get_canvas_secret.get_secret()
     credentials = json.loads(secret)
     TOKEN = credentials['adminAccessToken']
-    secret = utils.get_rds_secret.get_secret()
-    credentials = json.loads(secret)
-    username = credentials['username']
-    password = credentials['password']
-    # Database connection parameters
-    static_db_config = utils.get_rds_secret.load_db_config()
-    # Combine static DB config and dynamic credentials
-    DB_CONFIG = {
-        **static_db_config,
-        "user": username,
-        "password": password
-    }
 
-    create_config_table(DB_CONFIG)
+    create_config_table()
     # Invoke refreshCourse for each course
     for course in courses:
         # fetch course config and check if auto update is on
         if course["workflow_state"] == "available":
             course_config = call_get_course_config(TOKEN, course["id"], lambda_client)
             auto_update_on = course_config.get("autoUpdateOn", False)
-            create_vectors_table(DB_CONFIG, course["id"])
+            create_vectors_table(course["id"])
             if (auto_update_on):
                 invoke_refresh_course(course["id"])
                 refreshed_courses.append(course["id"])
@@ -1,27 +1,57 @@
 import json
 import boto3
+from botocore.config import Config
 import psycopg2.extras
 import psycopg2
 import requests  # to make HTTP requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import utils
 import os
 import utils.get_canvas_secret
-import utils.get_rds_secret
+from utils.db_connection import transaction
 from utils.construct_response import construct_response
 from utils.canvas_api_calls import get_files_by_course_id
+from utils.retrieve_course_config import retrieve_course_config
+from utils.course_manifest import (
+    build_manifest_entry, is_eligible_file, load_course_manifest, save_course_manifest, diff_course_files,
+    list_course_object_keys
+)
 
-s3_client = boto3.client('s3')
+# Room for every multipart part in flight across concurrent uploads
+s3_client = boto3.client('s3', config=Config(max_pool_connections=32))
 env_prefix = os.environ.get("ENV_PREFIX")
 bucket_name = f"{env_prefix}bucket-for-course-documents"
-lambda_client = boto3.client("lambda")
+# Most keys accepted by one S3 DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+# Canvas files copied to S3 at the same time, and how often one file is attempted
+MAX_UPLOAD_WORKERS = 8
+MAX_UPLOAD_ATTEMPTS = 3
+UPLOAD_BACKOFF_SECONDS = 1
+# Files above 16MB are uploaded as 8MB parts, up to 4 at a time per file. The Canvas response stream is not
+# seekable, so every part is buffered in memory: at most MAX_IN_MEMORY_UPLOAD_CHUNKS parts per file, i.e.
+# MAX_UPLOAD_WORKERS * MAX_IN_MEMORY_UPLOAD_CHUNKS * 8MB = 256MB in total, within the function's 1024MB
+MAX_IN_MEMORY_UPLOAD_CHUNKS = 4
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+    max_in_memory_upload_chunks=MAX_IN_MEMORY_UPLOAD_CHUNKS
+)
+# Shared by every upload of this execution environment, created on first use
+http_session = None
+# fetchReadFromS3 runs synchronously for up to 15 minutes; the default 60s read timeout would make botocore retry it
+lambda_client = boto3.client("lambda", config=Config(read_timeout=900, connect_timeout=10, retries={"max_attempts": 0}))
 
 def lambda_handler(event, context):
     body = json.loads(event.get("body", {}))
     course_id = body.get("course", {})  # Read course ID from request body
     course_id = str(course_id)
     running_async = body.get("async", False)
-
-    empty_s3_course_folder(bucket_name, course_id)
+    full_refresh = body.get("full", False)
 
     is_recursive = body.get("recursive", False)
     if running_async and not is_recursive:
@@ -52,109 +82,180 @@ def lambda_handler(event, context):
         if files is None:
             return construct_response(500, {"error": "Failed to fetch files from Canvas API"})
         
-        # Store course documents into S3 buckets
-        text_format = {"txt", "md", "c", "cpp", "css", "go", "py", "js", "rtf", "pdf", "docx", "html"}
-        for file in files:
-            if file["locked"] == False and file['upload_status'] == 'success' and file["hidden"] == False and get_extension(file["display_name"]) in text_format:
-                file_name = file["display_name"]
-                file_url = file["url"]  # Canvas file URL
-                file_key = f"{course_id}/{file['filename']}"  # Store in "course_id/" folder
-                file_updated = file["updated_at"]
-                try:
-                    with requests.get(file_url, stream=True, verify=False) as response:
-                        response.raise_for_status()  # Ensure request success
-
-                        # Upload stream directly to S3 with metadata
-                        s3_client.upload_fileobj(
-                            response.raw,
-                            bucket_name,
-                            file_key,
-                            ExtraArgs={
-                                "Metadata": {
-                                    "original_url": file_url,
-                                    "display_name": file_name,
-                                    "updated_at": file_updated,
-                                }
-                            }
-                        )
-                
-                except Exception as e:
-                    print(f"Failed to upload: {e}")
-                
-        secret = utils.get_rds_secret.get_secret()
-        credentials = json.loads(secret)
-        username = credentials['username']
-        password = credentials['password']
-        static_db_config = utils.get_rds_secret.load_db_config()
-        # Combine static DB config and dynamic credentials
-        DB_CONFIG = {
-            **static_db_config,
-            "user": username,
-            "password": password
+        course_config = retrieve_course_config(course_id)
+        if isinstance(course_config, str):
+            return construct_response(500, {"error": "Error retrieving course configuration"})
+        included_content = course_config["selectedIncludedCourseContent"]
+
+        current_files = {
+            f"{course_id}/{file['filename']}": build_manifest_entry(file)  # Store in "course_id/" folder
+            for file in files if is_eligible_file(file)
         }
 
-        # delete this course vector
-        del_response = delete_vectors_by_course(DB_CONFIG, course_id)
-        if not del_response:
-            return construct_response(500, {"message": f"Error while deleting course vector storage"})
+        # Incremental sync against the files of the last successful sync. Without a manifest, or when the
+        # included content types changed, every file is uploaded and the course is re-ingested in full.
+        manifest = None if full_refresh else load_course_manifest(bucket_name, course_id)
+        if manifest is not None and manifest.get("includedCourseContent") != included_content:
+            print("Included course content changed since the last sync, running a full sync")
+            manifest = None
+
+        if manifest is None:
+            previous_files = {}
+            files_to_upload = list(current_files)
+            stored_keys = list_course_object_keys(bucket_name, course_id) or []
+            removed_keys = [key for key in stored_keys if key not in current_files]
+            pending_keys = []
+        else:
+            previous_files = manifest.get("files", {})
+            added_keys, modified_keys, removed_keys = diff_course_files(previous_files, current_files)
+            files_to_upload = added_keys + modified_keys
+            # Files uploaded or removed by a sync whose ingestion did not complete
+            pending_keys = [key for key in manifest.get("pendingKeys", []) if key in current_files]
+            removed_keys += [key for key in manifest.get("pendingRemovedKeys", []) if key not in removed_keys]
+        print(f"Syncing course {course_id}: {len(files_to_upload)} files to upload, {len(removed_keys)} to remove")
+
+        # Objects are overwritten in place, so students keep retrieving from the previous version until re-ingestion
+        upload_progress = upload_course_files(files_to_upload, current_files)
+        uploaded_keys = [key for key in files_to_upload if upload_progress[key]["status"] == "uploaded"]
+        delete_course_objects(bucket_name, removed_keys)
 
-        response = call_fetch_read_from_s3(course_id)
+        # Files that failed to upload keep their previous entry so that the next sync retries them
+        synced_files = dict(current_files)
+        for key in set(files_to_upload) - set(uploaded_keys):
+            if key in previous_files:
+                synced_files[key] = previous_files[key]
+            else:
+                del synced_files[key]
+        changed_keys = uploaded_keys + [key for key in pending_keys if key not in uploaded_keys]
+
+        # Written before ingestion, which reads the file metadata from it instead of one HEAD request per file.
+        # The changes stay pending until ingestion succeeds, so that a failed run is picked up by the next sync
+        previous_content = manifest.get("includedCourseContent") if manifest else None
+        save_course_manifest(bucket_name, course_id, synced_files, previous_content, changed_keys, removed_keys)
+
+        # The course vectors are never dropped: ingestion only embeds chunks that changed
+        # and removes the ones that disappeared, so retrieval keeps working during the refresh
+        sync = None if manifest is None else {"changedKeys": changed_keys, "removedKeys": removed_keys}
+        response = call_fetch_read_from_s3(course_id, sync)
 
         # Check if the status is OK
-        if response.get("statusCode") == 200:
+        if response and response.get("statusCode") == 200:
+            save_course_manifest(bucket_name, course_id, synced_files, included_content)
             # Update the last_updated time
-            update_course_last_update_time(course_id, DB_CONFIG)
+            update_course_last_update_time(course_id)
             return construct_response(200, {"message": f"Refreshed content for course {course_id}"})
         else:
             return construct_response(500, {"message": f"Content for course {course_id} is not refreshed!"})
 
-def get_extension(file_name):
-    parts = file_name.split(".")
-    extension = parts[-1]
-    return extension
+def get_http_session():
+    """
+    One pooled session per execution environment, so Canvas downloads reuse their connections.
+    Failed requests are retried by urllib3 before a download is attempted again.
+    """
+    global http_session
+    if http_session is None:
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"]
+        )
+        adapter = HTTPAdapter(pool_connections=MAX_UPLOAD_WORKERS, pool_maxsize=MAX_UPLOAD_WORKERS, max_retries=retry)
+        http_session = requests.Session()
+        http_session.mount("https://", adapter)
+        http_session.mount("http://", adapter)
+    return http_session
 
-def update_course_last_update_time(course_id, DB_CONFIG):
-    connection = psycopg2.connect(**DB_CONFIG)
-    cursor = connection.cursor()
+def upload_course_files(file_keys, entries):
+    """
+    Copies the given Canvas files into S3 with MAX_UPLOAD_WORKERS downloads in flight.
+    Returns {file_key: {"status", "attempts", "bytes", "error"}} describing each file's progress.
+    """
+    progress = {
+        file_key: {"status": "pending", "attempts": 0, "bytes": 0, "error": None}
+        for file_key in file_keys
+    }
+    if not file_keys:
+        return progress
+
+    get_http_session()  # Created before the workers start so that they all share it
+
+    def upload(file_key):
+        upload_course_file(file_key, entries[file_key], progress[file_key])
+
+    with ThreadPoolExecutor(max_workers=min(MAX_UPLOAD_WORKERS, len(file_keys))) as executor:
+        list(executor.map(upload, file_keys))
+
+    failed = [file_key for file_key in file_keys if progress[file_key]["status"] != "uploaded"]
+    uploaded_bytes = sum(file_progress["bytes"] for file_progress in progress.values())
+    print(f"Uploaded {len(file_keys) - len(failed)} of {len(file_keys)} files ({uploaded_bytes} bytes)")
+    for file_key in failed:
+        print(f"Failed to upload {file_key} after {progress[file_key]['attempts']} attempts: {progress[file_key]['error']}")
+    return progress
+
+def upload_course_file(file_key, entry, file_progress):
+    """
+    Streams one Canvas file into S3 with its metadata, retrying the whole transfer with backoff since a
+    consumed download stream cannot be rewound. Progress is recorded in file_progress.
+    """
+    for attempt in range(1, MAX_UPLOAD_ATTEMPTS + 1):
+        file_progress["attempts"] = attempt
+        file_progress["bytes"] = 0
+        file_progress["status"] = "uploading"
+
+        def record_bytes(transferred):
+            file_progress["bytes"] += transferred
+
+        try:
+            with get_http_session().get(entry["original_url"], stream=True, verify=False, timeout=(10, 60)) as response:
+                response.raise_for_status()  # Ensure request success
+
+                # Upload stream directly to S3 with metadata, large files go up as concurrent multipart parts
+                s3_client.upload_fileobj(
+                    response.raw,
+                    bucket_name,
+                    file_key,
+                    ExtraArgs={
+                        "Metadata": {
+                            "original_url": entry["original_url"],
+                            "display_name": entry["display_name"],
+                            "updated_at": entry["updated_at"],
+                        }
+                    },
+                    Config=TRANSFER_CONFIG,
+                    Callback=record_bytes
+                )
+            file_progress["status"] = "uploaded"
+            file_progress["error"] = None
+            return True
+        except Exception as e:
+            file_progress["status"] = "failed"
+            file_progress["error"] = str(e)
+            if attempt < MAX_UPLOAD_ATTEMPTS:
+                time.sleep(UPLOAD_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+    return False
+
+def update_course_last_update_time(course_id):
     update_query = """
     UPDATE course_configuration
     SET material_last_updated_time = NOW()
     WHERE course_id = %s;
     """
-    cursor.execute(update_query, (course_id,))
-    connection.commit()
-    cursor.close()
-    connection.close()
+    with transaction() as cursor:
+        cursor.execute(update_query, (course_id,))
     return
 
-def delete_vectors_by_course(DB_CONFIG, course_id):
-    # Connect to the PostgreSQL database
-    try:
-        # Connect to the PostgreSQL database
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-
-        # Delete query
-        drop_table_query = f"""
-        DROP TABLE IF EXISTS course_vectors_{course_id};
-        """
-        cursor.execute(drop_table_query)
-
-        connection.commit()
-        cursor.close()
-        return "Success"
-    except Exception as e:
-        return None
-        
-def call_fetch_read_from_s3(course_id):
+def call_fetch_read_from_s3(course_id, sync=None):
     """
-    Calls getcourseconfig.
+    Calls fetchReadFromS3, restricted to the changed and removed files when sync is given.
     """
     payload = {
         "queryStringParameters": {
             "course": course_id
         }
     }
+    if sync is not None:
+        payload["sync"] = sync
     try:
         response = lambda_client.invoke(
             FunctionName=f"{env_prefix}FetchReadFromS3Function",  # Replace with actual function name
@@ -167,18 +268,19 @@ def call_fetch_read_from_s3(course_id):
         print(f"Error invoking Lambda function: {e}")
         return None
 
-def empty_s3_course_folder(bucket_name, course_id):
+def delete_course_objects(bucket_name, keys):
     """
-    Deletes all files in the S3 bucket that belong to a specific course.
+    Deletes the given course files from S3, up to 1000 keys per request.
     """
-    prefix = f"{course_id}/"  # Folder for the course
-    try:
-        objects_to_delete = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-
-        if "Contents" in objects_to_delete:
-            delete_keys = [{"Key": obj["Key"]} for obj in objects_to_delete["Contents"]]
-            s3_client.delete_objects(Bucket=bucket_name, Delete={"Objects": delete_keys})
-            print(f"Deleted all files under {prefix} in S3.")
-
-    except Exception as e:
-        print(f"Error deleting files from S3: {e}")
\ No newline at end of file
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[i:i + DELETE_BATCH_SIZE]
+        try:
+            response = s3_client.delete_objects(
+                Bucket=bucket_name,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+            )
+            for error in response.get("Errors", []):
+                print(f"Error deleting {error.get('Key')} from S3: {error.get('Message')}")
+            print(f"Deleted {len(batch)} removed files from S3.")
+        except Exception as e:
+            print(f"Error deleting files from S3: {e}")
@@ -1,5 +1,6 @@
 from utils.construct_response import construct_response
 from utils.canvas_api_calls import refresh_token
+from utils.get_user_info import record_token, invalidate_refreshed_session
 
 def lambda_handler(event, context):
     headers = event.get("headers", {})
@@ -17,7 +18,9 @@ def lambda_handler(event, context):
     
     response_body = {
         "access_token": canvas_response["access_token"],
-        "expires_in": 3600
+        "expires_in": canvas_response.get("expires_in", 3600)
     }
+    invalidate_refreshed_session(token)
+    record_token(response_body["access_token"], response_body["expires_in"], refresh_token=token)
     
     return construct_response(200, response_body)
\ No newline at end of file
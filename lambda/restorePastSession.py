@@ -2,11 +2,11 @@ import os
 import boto3
 from utils.get_user_info import get_user_info
 from utils.construct_response import construct_response
+from utils.message_hydration import hydrate_messages
 
 # Initialize DynamoDB client
 dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
 env_prefix = os.environ.get("ENV_PREFIX")
-messages_table = dynamodb.Table(f"{env_prefix}Messages")
 conversations_table = dynamodb.Table(f"{env_prefix}Conversations")
 
 
@@ -42,15 +42,7 @@ def lambda_handler(event, context):
 
         # Fetch all messages in the conversation
         message_ids = conversation_data.get("message_list", [])
-        messages = []
-
-        for message_id in message_ids:
-            message = messages_table.get_item(Key={"message_id": message_id})
-            if "Item" in message:
-                messages.append(message["Item"])
-
-        # Sort messages by timestamp
-        messages.sort(key=lambda x: x.get("timestamp", ""))
+        messages = hydrate_messages(message_ids)
 
         response_body = {
             "conversation": conversation_data,
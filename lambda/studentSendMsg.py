@@ -3,19 +3,26 @@ import json
 import boto3
 import uuid
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from utils.get_user_info import get_user_info
 from utils.get_course_related_stuff import call_course_activity_stream
-from utils.retrieve_course_config import call_get_course_config
+from utils.chat_engine import get_conversation_prompt, complete, get_course_system_prompt
 from utils.translation import translate_document_names
+from utils.course_messages import with_index_keys
+from utils.course_stats import record_turn, is_new_session, record_reference, count_references
 from utils.construct_response import construct_response
 
-lambda_client = boto3.client('lambda')
 dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
 env_prefix = os.environ.get("ENV_PREFIX")
 messages_table = dynamodb.Table(f"{env_prefix}Messages")
 conversations_table = dynamodb.Table(f"{env_prefix}Conversations")
 translate_client = boto3.client("translate", region_name=os.getenv('AWS_REGION'))
 
+# Threads used to overlap independent requests of a turn, kept across warm invocations.
+# A turn writes its messages and one counter update per referenced document at the same time
+IO_WORKERS = 8
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS)
+
 def lambda_handler(event, context):
     try:
         # authenticate first
@@ -70,13 +77,14 @@ def lambda_handler(event, context):
             # generate a system prompt, add to msg
             message_id = str(uuid.uuid4())
             timestamp = datetime.datetime.utcnow().isoformat()
-            response = call_get_course_config(auth_token, course_id, lambda_client)
-            course_config_prompt = response.get("systemPrompt", {})
+            # The course config (database) and the activity stream (Canvas) do not depend on each other
+            config_future = io_executor.submit(get_course_system_prompt, auth_token, course_id)
+            activity_future = io_executor.submit(call_course_activity_stream, auth_token, course_id)
+            course_config_prompt = config_future.result() or ""
             # print("Course config prompt: ", course_config_prompt)
-            recentCourseRelated_stuff = call_course_activity_stream(auth_token, course_id)
+            recentCourseRelated_stuff = activity_future.result()
             # print("recentCourseRelated_stuff: ", recentCourseRelated_stuff)
-            welcome_response = generate_welcome_message(course_config_prompt, student_name, recentCourseRelated_stuff, course_id, student_language_pref, local_time)
-            # print("welcome response", welcome_response)
+            welcome_prompt = course_config_prompt
             if local_time:
                 course_config_prompt += f"\nNote: The student’s local time is {local_time}."
             course_config_prompt += f"\n Please respond to all messages in markdown format. \n The student you are talking to is {student_name}, and here are some recent course material: {recentCourseRelated_stuff}. Respond to the user's question without any greetings, introductions, or unnecessary context."
@@ -90,7 +98,10 @@ def lambda_handler(event, context):
                 "course_id": str(course_id)
             }
             # print("new system message: ", new_message)
-            
+
+            welcome_response = generate_welcome_message(welcome_prompt, student_name, recentCourseRelated_stuff, course_id, student_language_pref, local_time)
+            # print("welcome response", welcome_response)
+
             # Create an welcoming AI message
             welcome_message_id = str(uuid.uuid4())
             welcome_response_content = welcome_response.get('response')
@@ -107,18 +118,8 @@ def lambda_handler(event, context):
             }
             # print("AI response: ", ai_message)
 
-            # Insert the message into the Messages table
-            try:
-                messages_table.put_item(Item=new_message)
-            except Exception as e:
-                print(f"Failed to insert message: {e}")
-
-            # Update the Conversations table
-            update_conversation(conversation_id, course_id, student_id, message_id, timestamp)
-            # Insert AI response into the Messages table
-            messages_table.put_item(Item=ai_message)
-            # Update the conversation with the AI response
-            update_conversation(conversation_id, course_id, student_id, welcome_message_id, timestamp)
+            # The conversation is only created once the welcome message exists
+            save_turn(conversation_id, course_id, student_id, [new_message, ai_message], timestamp)
 
             response_body = {
                 "conversation_id": conversation_id,
@@ -126,9 +127,10 @@ def lambda_handler(event, context):
             }
             return construct_response(200, response_body)
         else:
-            # call generate LLM prompt
-            response_body = call_generate_llm_prompt(conversation_id, course_id)
-            past_conversation = response_body.get('prompt')
+            # build the prompt holding the conversation so far
+            past_conversation = get_conversation_prompt(conversation_id, course_id)
+            if past_conversation is None:
+                return construct_response(500, {"error": "Failed to load the conversation"})
 
             # Generate a unique message ID and current timestamp
             message_id = str(uuid.uuid4())
@@ -146,7 +148,7 @@ def lambda_handler(event, context):
 
             # Create an AI response
             ai_message_id = str(uuid.uuid4())
-            ai_response_dict = generate_ai_response(message_content, past_conversation, course_id, student_language_pref)
+            ai_response_dict = complete(message_content, course_id, past_conversation, student_language_pref)
             ai_response_content = ai_response_dict.get('response')
             ai_response_sources = ai_response_dict.get("sources")
             translated_documents = translate_document_names(ai_response_sources, student_language_pref, translate_client)
@@ -160,21 +162,8 @@ def lambda_handler(event, context):
                 "msg_timestamp": datetime.datetime.utcnow().isoformat(),
             }
 
-            # Insert the message into the Messages table
-            try:
-                messages_table.put_item(Item=new_message)
-            except Exception as e:
-                print(f"Failed to insert message: {e}")
-
-            # Update the Conversations table
-            update_conversation(conversation_id, course_id, student_id, message_id, timestamp)
-
-
-            # Insert AI response into the Messages table
-            messages_table.put_item(Item=ai_message)
-
-            # Update the conversation with the AI response
-            update_conversation(conversation_id, course_id, student_id, ai_message_id, timestamp)
+            # Store both messages and append them to the conversation
+            save_turn(conversation_id, course_id, student_id, [new_message, ai_message], timestamp)
 
             response_body = {
                 "conversation_id": conversation_id,
@@ -187,59 +176,71 @@ def lambda_handler(event, context):
         print(f"Error: {e}")
         return construct_response(500, {"error": "Internal Server Error"})
 
-def update_conversation(conversation_id, course_id, student_id, message_id, timestamp):
+def write_messages(messages):
     """
-    Updates the Conversations table with the new message.
+    Inserts the messages into the Messages table in one batch, retrying unprocessed items.
+    """
+    with messages_table.batch_writer() as batch:
+        for message in messages:
+            batch.put_item(Item=with_index_keys(message))
+
+def save_turn(conversation_id, course_id, student_id, messages, timestamp):
+    """
+    Persists the messages of one turn: the batch write to Messages runs while the Conversations table
+    is updated, and both message ids are appended in a single update. The course's daily engagement
+    and material counters are updated from the same turn.
+    """
+    futures = [io_executor.submit(write_messages, messages)]
+    try:
+        for message in messages:
+            if message["msg_source"] == "AI":
+                futures += [
+                    io_executor.submit(record_reference, course_id, doc_name, doc_url, count, timestamp)
+                    for (doc_name, doc_url), count in count_references(message.get("references_en")).items()
+                ]
+        message_count = update_conversation(conversation_id, course_id, student_id, [message["message_id"] for message in messages], timestamp)
+        questions_asked = sum(1 for message in messages if message["msg_source"] == "STUDENT")
+        new_sessions = 1 if is_new_session(message_count - len(messages), message_count) else 0
+        record_turn(course_id, student_id, questions_asked, new_sessions, timestamp)
+    finally:
+        for future in futures:
+            future.result()
+
+def update_conversation(conversation_id, course_id, student_id, message_ids, timestamp):
+    """
+    Updates the Conversations table with the new messages, appended in order.
+    Returns the number of messages in the conversation afterwards.
     """
     course_id = str(course_id)
     try:
-        conversations_table.update_item(
+        response = conversations_table.update_item(
             Key={"conversation_id": conversation_id},
             UpdateExpression="""
                 SET 
                     course_id = if_not_exists(course_id, :course_id),
                     student_id = if_not_exists(student_id, :student_id),
                     time_created = if_not_exists(time_created, :time_created),
-                    message_list = list_append(if_not_exists(message_list, :empty_list), :message_id),
+                    message_list = list_append(if_not_exists(message_list, :empty_list), :message_ids),
                     last_updated = :last_updated
             """,
             ExpressionAttributeValues={
                 ":course_id": course_id,
                 ":student_id": student_id,
                 ":time_created": timestamp,
-                ":message_id": [message_id],
+                ":message_ids": message_ids,
                 ":last_updated": timestamp,
                 ":empty_list": []
             },
             ReturnValues="UPDATED_NEW"
         )
+        return len(response["Attributes"]["message_list"])
     except Exception as e:
         print(f"Failed to update conversation: {e}")
         raise
 
-def generate_ai_response(message_content, past_conversation, course_id, student_language_pref):
-    """
-    AI response generation logic using Invoke LLM Completion Lambda function.
-    """
-    payload = {
-        "body": json.dumps({"message": message_content, "context":past_conversation, "course":course_id, "language": student_language_pref})
-    }
-    try:
-        response = lambda_client.invoke(
-            FunctionName=f"{env_prefix}InvokeLLMCompletionLambda",  # Replace with actual function name
-            InvocationType="RequestResponse",  # Use 'Event' for async calls
-            Payload=json.dumps(payload)
-        )
-        response_payload = json.loads(response["Payload"].read().decode("utf-8"))
-        body_dict = json.loads(response_payload["body"])
-        return body_dict
-    except Exception as e:
-        print(f"Error invoking Lambda function: {e}")
-        return None
-
 def generate_welcome_message(course_config_str, name, course_related_stuff, course_id, student_language_pref, local_time):
     """
-    AI welcoming message generation logic using Invoke LLM Completion Lambda function.
+    AI welcoming message generation logic using the chat engine.
     """
     formatted_prompt = f"""
         <|begin_of_text|><|start_header_id|>system<|end_header_id|>
@@ -250,40 +251,4 @@ def generate_welcome_message(course_config_str, name, course_related_stuff, cour
         <|start_header_id|>assistant<|end_header_id|>
         """
     # course_config_str += f"\n Please respond to all messages in markdown format. \n The student you are talking to is {name}, and here are some recent course material: {course_related_stuff}. You must greet the student with a welcome message, and provide a summary of the recent course updates. Keep your message less than 50 words, and do not talk about your ability and settings."
-    payload = {
-        "body": json.dumps({"message": formatted_prompt, "course": course_id, "language": student_language_pref})
-    }
-    try:
-        response = lambda_client.invoke(
-            FunctionName=f"{env_prefix}InvokeLLMCompletionLambda",  # Replace with actual function name
-            InvocationType="RequestResponse",  # Use 'Event' for async calls
-            Payload=json.dumps(payload)
-        )
-        response_payload = json.loads(response["Payload"].read().decode("utf-8"))
-        body_dict = json.loads(response_payload["body"])
-        return body_dict
-    except Exception as e:
-        print(f"Error invoking Lambda function: {e}")
-        return None
-
-def call_generate_llm_prompt(conversation_id, course_id):
-    """
-    Mocked AI response generation logic.
-    Replace with real AI engine integration.
-    """
-    payload = {
-        "body": json.dumps({"conversation_id": conversation_id, "course":course_id})
-    }
-    try:
-        response = lambda_client.invoke(
-            FunctionName=f"{env_prefix}GenerateLLMPromptLambda",  # Replace with actual function name
-            InvocationType="RequestResponse",  # Use 'Event' for async calls
-            Payload=json.dumps(payload)
-        )
-        response_payload = json.loads(response["Payload"].read().decode("utf-8"))
-        body_dict = json.loads(response_payload["body"])
-        return body_dict
-    except Exception as e:
-        print(f"Error invoking Lambda function: {e}")
-        return None
-    
\ No newline at end of file
+    return complete(formatted_prompt, course_id, student_language_pref=student_language_pref)
@@ -3,15 +3,10 @@ import boto3
 from datetime import datetime, timedelta
 from utils.get_user_info import get_user_info
 from utils.construct_response import construct_response
-from utils.canvas_api_calls import get_instructor_courses
-from utils.scan_all_conversations import scan_all_conversations
+from utils.instructor_courses import is_course_instructor
+from utils.course_stats import get_top_materials
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
 env_prefix = os.environ.get("ENV_PREFIX")
-messages_table = dynamodb.Table(f"{env_prefix}Messages")
-dynamodb_client = boto3.client('dynamodb')  # Client needed for batch_get_item
-conversations_table = dynamodb.Table(f"{env_prefix}Conversations")
 DEBUG = True
 
 def lambda_handler(event, context):
@@ -30,12 +25,6 @@ def lambda_handler(event, context):
         if not student_id:
             return construct_response(500, {"error": "User ID not found"})
 
-        courses_as_instructor = get_instructor_courses(auth_token)
-        if courses_as_instructor is None:
-            return construct_response(500, {"error": "Failed to fetch instructor courses from Canvas"})
-        
-        list_of_courses_as_instructor = [course["id"] for course in courses_as_instructor]
-
         # Extract query parameters
         query_params = event.get("queryStringParameters", {})
         course_id = query_params.get("course")
@@ -45,7 +34,10 @@ def lambda_handler(event, context):
         if not course_id or not num or not period:
             return construct_response(400, {"error": "Missing required query parameters: 'course', 'num', and 'period' are required"})
 
-        if int(course_id) not in list_of_courses_as_instructor:
+        is_instructor = is_course_instructor(auth_token, student_id, course_id)
+        if is_instructor is None:
+            return construct_response(500, {"error": "Failed to fetch instructor courses from Canvas"})
+        if not is_instructor:
             return construct_response(400, {"error": "You are not the instructor for this course."})
 
         # Convert num to int
@@ -59,36 +51,11 @@ def lambda_handler(event, context):
         if time_threshold is None:
             return construct_response(400, {"error": "Invalid period value. Must be WEEK, MONTH, or TERM."})
 
-        # Scan Conversations table for course_id and time threshold
-        conversations = scan_all_conversations(course_id, time_threshold)
-        message_ids = []
-
-        # Collect all message IDs
-        for conversation in conversations:
-            message_ids.extend(conversation.get("message_list", []))
+        # Sum the course's daily reference counters over the period
+        top_materials = get_top_materials(course_id, num, time_threshold)
 
         if DEBUG:
-            print(f"Total message IDs fetched: {len(message_ids)}")
-
-        # Get all messages using the collected message IDs
-        messages = batch_get_messages_ai_only(message_ids)
-
-        if DEBUG:
-            print(f"Total messages fetched: {len(messages)}")
-        
-        material_dict = {}
-        
-        for message in messages:
-            print("Message: ", message)
-            references = message.get("references_en") or message.get("references")
-            if references and isinstance(references, list):
-                for source in references:
-                    doc_url = source.get("sourceUrl")
-                    doc_name = source.get("documentName")
-                    if doc_name and doc_url:
-                        material_dict[(doc_name, doc_url)] = material_dict.get((doc_name, doc_url), 0) + 1
-        
-        top_materials = sorted(material_dict.items(), key=lambda x: x[1], reverse=True)[:num]
+            print(f"Top materials: {top_materials}")
         
         top_materials_list = [{"title": material[0], "link": material[1]} for (material, _count) in top_materials]
 
@@ -111,34 +78,3 @@ def calculate_time_threshold(period):
         return (now - timedelta(days=90)).isoformat()
     else:
         return None
-
-
-def batch_get_messages_ai_only(message_ids):
-    from boto3.dynamodb.types import TypeDeserializer
-    deserializer = TypeDeserializer()
-
-    ai_messages = []
-
-    for i in range(0, len(message_ids), 100):
-        batch_keys = [{"message_id": {"S": msg_id}} for msg_id in message_ids[i:i+100]]
-
-        response = dynamodb_client.batch_get_item(
-            RequestItems={
-                messages_table.table_name: {
-                    "Keys": batch_keys,
-                    "ProjectionExpression": "message_id, msg_source, content, msg_timestamp, references_en, #r",
-                    "ExpressionAttributeNames": {
-                        "#r": "references"
-                    }
-                }
-            }
-        )
-
-        batch_messages = response.get("Responses", {}).get(messages_table.table_name, [])
-
-        for msg in batch_messages:
-            deserialized = {k: deserializer.deserialize(v) for k, v in msg.items()}
-            if deserialized.get("msg_source") == "AI":
-                ai_messages.append(deserialized)
-
-    return ai_messages
@@ -5,20 +5,14 @@ from datetime import datetime, timedelta
 import re
 from utils.get_user_info import get_user_info
 from utils.construct_response import construct_response
-from utils.canvas_api_calls import get_instructor_courses
-from boto3.dynamodb.types import TypeDeserializer
-from utils.scan_all_conversations import scan_all_conversations
-deserializer = TypeDeserializer()
+from utils.instructor_courses import is_course_instructor
+from utils.course_messages import query_course_messages
+from utils.question_clustering import find_question_clusters
 
 # Enable or disable debug statements
 DEBUG = True
 
-# Initialize DynamoDB client
-dynamodb_client = boto3.client('dynamodb')  # Client needed for batch_get_item
-dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
 env_prefix = os.environ.get("ENV_PREFIX")
-conversations_table = dynamodb.Table(f"{env_prefix}Conversations")
-messages_table = dynamodb.Table(f"{env_prefix}Messages")
 session = boto3.Session()
 bedrock = session.client('bedrock-runtime', region_name=os.getenv('AWS_REGION'))
 
@@ -42,13 +36,6 @@ def lambda_handler(event, context):
         if not student_id:
             return construct_response(500, {"error": "User ID not found"})
 
-        # Get instructor courses
-        courses_as_instructor = get_instructor_courses(auth_token)
-        if courses_as_instructor is None:
-            return construct_response(500, {"error": "Failed to fetch instructor courses from Canvas"})
-
-        list_of_courses_as_instructor = [course["id"] for course in courses_as_instructor]
-
         # Extract query parameters
         query_params = event.get("queryStringParameters", {})
         course_id = str(query_params.get("course"))
@@ -57,7 +44,10 @@ def lambda_handler(event, context):
 
         if not course_id or not num or not period:
             return construct_response(400, {"error": "Missing required query parameters: 'course', 'num', and 'period' are required"})
-        if int(course_id) not in list_of_courses_as_instructor:
+        is_instructor = is_course_instructor(auth_token, student_id, course_id)
+        if is_instructor is None:
+            return construct_response(500, {"error": "Failed to fetch instructor courses from Canvas"})
+        if not is_instructor:
             return construct_response(400, {"error": "You are not the instructor for this course."})
 
         # Convert num to int
@@ -73,70 +63,20 @@ def lambda_handler(event, context):
         if time_threshold is None:
             return construct_response(400, {"error": "Invalid period value. Must be WEEK, MONTH, or TERM."})
 
-        # Scan Messages table for the course and filter by timestamp
-        if DEBUG:
-            print(f"Scanning Conversations table for course_id={course_id} and period={period}")
-            
-        # Scan Conversations table for course_id and time threshold
-        conversations = scan_all_conversations(course_id, time_threshold)
-
-        if DEBUG:
-            print(f"Conversations scan response: {conversations}")
-
-        message_ids = []
-
-        # Collect all message IDs
-        for conversation in conversations:
-            message_ids.extend(conversation.get("message_list", []))
-
-        if DEBUG:
-            print(f"Total message IDs fetched: {len(message_ids)}")
-
-        # Get all messages using the collected message IDs
-        messages = batch_get_messages_student_only(message_ids)
+        # Query the student messages of the course sent since the threshold
+        messages = query_course_messages(course_id, "STUDENT", time_threshold, projection=["message_id", "content", "msg_timestamp"])
 
         if DEBUG:
             print(f"Total messages fetched: {len(messages)}")
 
-        # Count the frequency of each question
-        # messages = response.get("Items", [])
-        # if DEBUG:
-        #     print(f"Total messages fetched: {len(messages)}")
-
-        questions = ""
-        for msg in messages:
-            print("message: ", msg)
-            content = msg.get("content", "").strip().lower()
-            if content:
-                questions += content + ";"
-
-        # Prepare prompt for the LLM
-        formatted_prompt = f"""
-        <|begin_of_text|><|start_header_id|>system<|end_header_id|>
-        You are an AI that extracts the most frequently asked questions from student discussion messages. Analyze and group similar questions together, then return a Valid JSON array containing only top {str(num)} most frequently asked questions, like this: ['The most frequent Question', '2nd Most frequent Question', ..., 'Top nth most frequent Question']. Do NOT include any explanations, descriptions, or extra text. Questions are separated by semicolons (;). If no questions are given, return an empty array. The given questions are separated by semi-colons:
-        <|eot_id|>
-        <|start_header_id|>user<|end_header_id|>
-        Questions: {questions}
-        <|eot_id|>
-        <|start_header_id|>assistant<|end_header_id|>
-        """
-        
+        # Group the questions by meaning, most asked groups first
+        clusters = find_question_clusters(course_id, messages, num)
+        if clusters is None:
+            return construct_response(500, {"error": "Failed to embed student questions"})
         if DEBUG:
-            print(f"Formatted prompt for LLM: {formatted_prompt}")
+            print(f"Top question clusters: {clusters}")
 
-        # Call the LLM API to generate a response
-        llm_response = call_llm(formatted_prompt)
-        if DEBUG:
-            print(f"LLM raw response: {llm_response}")
-
-        try:
-            faq_list = json.loads(llm_response)  # Convert JSON string to Python list
-            if not isinstance(faq_list, list):  # Ensure it's a list
-                raise ValueError("LLM output is not a list")
-        except json.JSONDecodeError:
-            if DEBUG:
-                print("Error: LLM output is not valid JSON. Returning empty list.")
-            faq_list = []  # Fallback empty list
+        faq_list = name_question_clusters(clusters)
 
         if DEBUG:
             print(f"Final extracted FAQ list: {faq_list}")
@@ -163,14 +103,57 @@ def calculate_time_threshold(period):
         return None
 
 
-def call_llm(input_text):
+def name_question_clusters(clusters):
+    """
+    Asks the LLM for one question summarizing each cluster, in cluster order. Only the representative
+    questions of the top clusters are sent, so the prompt size does not depend on the message volume.
+    Falls back to the most asked question of a cluster if the LLM output cannot be used.
+    """
+    if not clusters:
+        return []
+    fallback = [cluster["questions"][0] for cluster in clusters]
+
+    groups = "\n".join(
+        f"Group {i + 1}: " + "; ".join(cluster["questions"])
+        for i, cluster in enumerate(clusters)
+    )
+    formatted_prompt = f"""
+        <|begin_of_text|><|start_header_id|>system<|end_header_id|>
+        You are an AI that summarizes groups of similar student questions. For each group, write the one question that best represents it. Return a Valid JSON array containing exactly {len(clusters)} questions, one per group and in the same order as the groups, like this: ["Question for group 1", "Question for group 2", ...]. Do NOT include any explanations, descriptions, or extra text.
+        <|eot_id|>
+        <|start_header_id|>user<|end_header_id|>
+        {groups}
+        <|eot_id|>
+        <|start_header_id|>assistant<|end_header_id|>
+        """
+
+    if DEBUG:
+        print(f"Formatted prompt for LLM: {formatted_prompt}")
+
+    # Call the LLM API to generate a response
+    llm_response = call_llm(formatted_prompt, max_gen_len=40 * len(clusters))
+    if DEBUG:
+        print(f"LLM raw response: {llm_response}")
+
+    try:
+        faq_list = json.loads(llm_response)  # Convert JSON string to Python list
+    except json.JSONDecodeError:
+        if DEBUG:
+            print("Error: LLM output is not valid JSON. Using the most asked question of each group.")
+        return fallback
+    if not isinstance(faq_list, list) or len(faq_list) != len(clusters):
+        return fallback
+    return [str(question) for question in faq_list]
+
+
+def call_llm(input_text, max_gen_len=150):
     """Invokes the LLM for completion."""
     model_id = "us.meta.llama3-3-70b-instruct-v1:0"
 
     try:
         response = bedrock.invoke_model(
             modelId=model_id,
-            body=json.dumps({"prompt": input_text, "max_gen_len": 150, "temperature": 0.5, "top_p": 0.9})
+            body=json.dumps({"prompt": input_text, "max_gen_len": max_gen_len, "temperature": 0.5, "top_p": 0.9})
         )
         
         response_body = response['body'].read().decode('utf-8')
@@ -191,41 +174,3 @@ def call_llm(input_text):
     except Exception as e:
         print(f"Error generating answer: {e}")
         return "Sorry, there was an error generating an answer."
-
-
-def batch_get_messages_student_only(message_ids):
-    from boto3.dynamodb.types import TypeDeserializer
-    deserializer = TypeDeserializer()
-
-    student_messages = []
-
-    for i in range(0, len(message_ids), 100):  # DynamoDB batch limit
-        batch_keys = [{"message_id": {"S": msg_id}} for msg_id in message_ids[i:i+100]]
-
-        if DEBUG:
-            print(f"Batch getting messages: {batch_keys}")
-
-        response = dynamodb_client.batch_get_item(
-            RequestItems={
-                messages_table.table_name: {
-                    "Keys": batch_keys,
-                    "ProjectionExpression": "message_id, msg_source, content, msg_timestamp, course_id"
-                }
-            }
-        )
-
-        batch_messages = response.get("Responses", {}).get(messages_table.table_name, [])
-
-        # Deserialize and filter
-        for msg in batch_messages:
-            print("msg: ", msg)
-            item = {k: deserializer.deserialize(v) for k, v in msg.items()}
-            if item.get("msg_source") == "STUDENT":
-                student_messages.append(item)
-
-        if DEBUG:
-            print(f"Batch fetched {len(batch_messages)} total; {len(student_messages)} STUDENT messages (cumulative)")
-
-        # Handle unprocessed keys if needed...
-
-    return student_messages
@@ -3,6 +3,7 @@ import json
 import boto3
 import traceback
 from utils.construct_response import construct_response
+from utils.message_hydration import hydrate_messages
 from utils.scan_all_conversations import scan_all_conversations_for_course
 
 # Initialize DynamoDB resource
@@ -55,17 +56,9 @@ def lambda_handler(event, context):
 
             log_debug(f"Processing conversation_id={conversation_id}, messages={len(message_list)}")
 
-            for message_id in message_list:
-                log_debug(f"Fetching message_id={message_id}")
-                
-                # Retrieve the message
-                message_response = messages_table.get_item(Key={"message_id": message_id})
-                message_item = message_response.get("Item")
-
-                if not message_item:
-                    log_debug(f"WARNING: message_id={message_id} not found in Messages table.")
-                    continue
-                
+            # Retrieve the messages, ids missing from the Messages table are skipped
+            for message_item in hydrate_messages(message_list):
+                message_id = message_item["message_id"]
                 log_debug(f"Retrieved message_id={message_id}, msg_source={message_item.get('msg_source')}")
                 
                 if message_item["msg_source"] == "SYSTEM":
@@ -5,11 +5,10 @@ import psycopg2.extras
 import os
 from utils.create_course_config_table import create_table_if_not_exists
 from utils.retrieve_course_config import create_system_prompt
-from utils.get_rds_secret import get_secret
+from utils.db_connection import transaction
 from utils.get_user_info import get_user_info
-from utils.get_rds_secret import load_db_config
 from utils.construct_response import construct_response
-from utils.canvas_api_calls import get_instructor_courses
+from utils.instructor_courses import is_course_instructor
 
 lambda_client = boto3.client("lambda")
 env_prefix = os.environ.get("ENV_PREFIX")
@@ -31,12 +30,6 @@ def lambda_handler(event, context):
     if not student_id:
         return construct_response(500, {"error": "User ID not found"})
 
-    courses_as_instructor = get_instructor_courses(auth_token)
-    if courses_as_instructor is None:
-        return construct_response(500, {"error": "Failed to fetch instructor courses from Canvas"})
-    
-    list_of_courses_as_instructor = [course["id"] for course in courses_as_instructor]
-    
     # Parse and validate the request body
     body = ""
     try:
@@ -59,22 +52,14 @@ def lambda_handler(event, context):
     auto_update_on = body.get("autoUpdateOn")
     custom_response_format = body.get("customResponseFormat", "Provide clear and helpful responses.")  # Nullable field
 
-    if int(course_id) not in list_of_courses_as_instructor:
+    is_instructor = is_course_instructor(auth_token, student_id, course_id)
+    if is_instructor is None:
+        return construct_response(500, {"error": "Failed to fetch instructor courses from Canvas"})
+    if not is_instructor:
         return construct_response(400, {"error": "You are not the instructor for this course."})
 
-    secret = get_secret()
-    credentials = json.loads(secret)
-    username = credentials['username']
-    password = credentials['password']
-    static_db_config = load_db_config()
-    # Combine static DB config and dynamic credentials
-    DB_CONFIG = {
-        **static_db_config,
-        "user": username,
-        "password": password
-    }
-    ret1 = create_table_if_not_exists(DB_CONFIG)
-    ret2 = update_course_config(DB_CONFIG, course_id, student_access_enabled, selected_supported_questions, 
+    ret1 = create_table_if_not_exists()
+    ret2 = update_course_config(course_id, student_access_enabled, selected_supported_questions, 
                                 selected_included_course_content, custom_response_format, auto_update_on)
     response_body = {
         "db create": ret1, 
@@ -83,15 +68,11 @@ def lambda_handler(event, context):
 
     return construct_response(200, response_body)
 
-def update_course_config(DB_CONFIG, course_id, student_access_enabled, selected_supported_questions, 
+def update_course_config(course_id, student_access_enabled, selected_supported_questions, 
                          selected_included_course_content, custom_response_format, auto_update_on=None):
     system_prompt = create_system_prompt(selected_supported_questions, custom_response_format)
     
     try:
-        # Connect to the PostgreSQL database
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-
         # Base query for inserting a new course config or updating existing ones
         query = """
         INSERT INTO course_configuration (course_id, student_access_enabled, selected_supported_questions, 
@@ -126,10 +107,8 @@ def update_course_config(DB_CONFIG, course_id, student_access_enabled, selected_
                 auto_update_update=""
             )
 
-        cursor.execute(query, query_params)
-        connection.commit()
-        cursor.close()
-        connection.close()
+        with transaction() as cursor:
+            cursor.execute(query, query_params)
 
         # Invoke prompt update
         invoke_update_system_prompt(system_prompt, course_id)
@@ -1,9 +1,6 @@
 import requests
 import json
-import utils.get_canvas_secret
-
-secret = utils.get_canvas_secret.get_secret()
-credentials = json.loads(secret)
+from utils.get_canvas_secret import get_canvas_credentials
 
 def make_canvas_api_call(url, request_type, headers, data={}, params={}):
     try:
@@ -42,6 +39,7 @@ def get_all_courses():
     """
     Fetch all courses from canvas lms.
     """
+    credentials = get_canvas_credentials()
     BASE_URL = credentials['baseURL']
     TOKEN = credentials['adminAccessToken']
     
@@ -54,6 +52,7 @@ def get_files_by_course_id(course_id):
     """
     Fetch all files from canvas lms.
     """
+    credentials = get_canvas_credentials()
     BASE_URL = credentials['baseURL']
     TOKEN = credentials['adminAccessToken']
     HEADERS = {"Authorization": f"Bearer {TOKEN}"}
@@ -63,6 +62,7 @@ def get_files_by_course_id(course_id):
     return make_canvas_api_call(url=url, request_type="get", headers=HEADERS)
 
 def refresh_token(refresh_token):
+    credentials = get_canvas_credentials()
     BASE_URL = credentials['baseURL']
     CLIENT_ID = credentials['apiKeyId']
     CLIENT_SECRET = credentials['apiKey']
@@ -82,6 +82,7 @@ def refresh_token(refresh_token):
     return make_canvas_api_call(url=url, request_type="post", headers=headers, data=data)
 
 def log_out(access_token):
+    credentials = get_canvas_credentials()
     BASE_URL = credentials['baseURL']
 
     url = f"{BASE_URL}/login/oauth2/token"
@@ -96,6 +97,7 @@ def log_out(access_token):
     return make_canvas_api_call(url=url, request_type="delete", headers=headers, params=params)
 
 def get_access_token(authorization_code):
+    credentials = get_canvas_credentials()
     BASE_URL = credentials['baseURL']
     CLIENT_ID = credentials['apiKeyId']
     CLIENT_SECRET = credentials['apiKey']
@@ -119,6 +121,7 @@ def get_user_info(token):
     """
     Fetch user info from canvas lms.
     """
+    credentials = get_canvas_credentials()
     BASE_URL = credentials['baseURL']
     HEADERS = {"Authorization": f"Bearer {token}"}
 
@@ -130,6 +133,7 @@ def get_student_courses(token):
     """
     Fetch all courses that user enrolled as a student.
     """
+    credentials = get_canvas_credentials()
     BASE_URL = credentials['baseURL']
     HEADERS = {"Authorization": f"Bearer {token}"}
 
@@ -141,6 +145,7 @@ def get_instructor_courses(token):
     """
     Fetch all courses that user enrolled as a instructor.
     """
+    credentials = get_canvas_credentials()
     BASE_URL = credentials['baseURL']
     HEADERS = {"Authorization": f"Bearer {token}"}
 
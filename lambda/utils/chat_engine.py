@@ -0,0 +1,68 @@
+import os
+import json
+import boto3
+from .conversation_prompt import build_conversation_prompt
+from .llm_completion import generate_completion
+from .retrieve_course_config import retrieve_course_config, call_get_course_config
+
+# "local" runs prompt assembly, retrieval and completion in the calling Lambda,
+# "remote" invokes GenerateLLMPromptLambda, InvokeLLMCompletionLambda and GetCourseConfigLambda instead
+CHAT_ENGINE_MODE = os.environ.get("CHAT_ENGINE_MODE", "local")
+
+lambda_client = boto3.client('lambda')
+env_prefix = os.environ.get("ENV_PREFIX")
+
+def is_remote():
+    return CHAT_ENGINE_MODE == "remote"
+
+def invoke_lambda(function_name, payload):
+    """
+    Synchronously invokes one of the chat Lambdas and returns the decoded body of its response.
+    """
+    response = lambda_client.invoke(
+        FunctionName=f"{env_prefix}{function_name}",
+        InvocationType="RequestResponse",
+        Payload=json.dumps(payload)
+    )
+    response_payload = json.loads(response["Payload"].read().decode("utf-8"))
+    return json.loads(response_payload["body"])
+
+def get_conversation_prompt(conversation_id, course_id):
+    """
+    The prompt holding the conversation so far, or None on error.
+    """
+    try:
+        if is_remote():
+            payload = {"body": json.dumps({"conversation_id": conversation_id, "course": course_id})}
+            return invoke_lambda("GenerateLLMPromptLambda", payload).get("prompt")
+        return build_conversation_prompt(conversation_id)
+    except Exception as e:
+        print(f"Error building conversation prompt: {e}")
+        return None
+
+def complete(message, course_id, context="", student_language_pref=""):
+    """
+    Generates the AI response to a message, {"response": ..., "sources": [...]}, or None on error.
+    """
+    try:
+        if is_remote():
+            body = {"message": message, "course": course_id, "language": student_language_pref}
+            if context:
+                body["context"] = context
+            return invoke_lambda("InvokeLLMCompletionLambda", {"body": json.dumps(body)})
+        return generate_completion(message, course_id, context, student_language_pref)
+    except Exception as e:
+        print(f"Error generating completion: {e}")
+        return None
+
+def get_course_system_prompt(auth_token, course_id):
+    """
+    The system prompt configured for the course, or None on error. The caller must have authenticated the user.
+    """
+    if is_remote():
+        response = call_get_course_config(auth_token, course_id, lambda_client)
+        return response.get("systemPrompt") if isinstance(response, dict) else None
+    course_config = retrieve_course_config(str(course_id))
+    if not isinstance(course_config, dict):
+        return None
+    return course_config.get("systemPrompt")
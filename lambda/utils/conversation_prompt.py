@@ -0,0 +1,50 @@
+import os
+import boto3
+from .message_hydration import hydrate_messages
+
+dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+env_prefix = os.environ.get("ENV_PREFIX")
+conversations_table = dynamodb.Table(f"{env_prefix}Conversations")
+
+def build_conversation_prompt(conversation_id):
+    """
+    Builds the Llama prompt of a conversation from its messages, or returns None if the conversation does not exist.
+    """
+    # Fetch conversation details
+    conversation = conversations_table.get_item(Key={"conversation_id": conversation_id})
+    if "Item" not in conversation:
+        return None
+
+    conversation_data = conversation["Item"]
+
+    # Fetch all messages in the conversation
+    message_ids = conversation_data.get("message_list", [])
+    messages = hydrate_messages(message_ids)
+
+    # Build the conversation message chain
+    # mistral_messages = []
+    ai_sources = set()
+    llama_msg = "<|begin_of_text|>"
+
+    for message in messages:
+        msg_source = message.get("msg_source")
+        content = message.get("content")
+        if msg_source == "STUDENT":
+            # mistral_messages.append({"role": "user", "content": content})
+            llama_msg += f"<|start_header_id|>user<|end_header_id|>{content}<|eot_id|>"
+        elif msg_source == "SYSTEM":
+            # mistral_messages.append({"role": "system", "content": content})
+            llama_msg += f"<|start_header_id|>system<|end_header_id|>{content}<|eot_id|>"
+        else: # AI
+            complete_content = content + ";\n Reference materials: "
+            references = message.get("references")
+            if references and isinstance(references, list):
+                for source in references:
+                    if source['documentContent'] and source['documentContent'] not in ai_sources:
+                        ai_sources.add(source['documentContent'])
+                        complete_content += source['documentContent'] + ";\n"
+                        # ai_sources_content += source['documentContent'] + ";\n"
+            # mistral_messages.append({"role": "assistant", "content": complete_content})
+            llama_msg += f"<|start_header_id|>assistant<|end_header_id|>{complete_content}<|eot_id|>"
+
+    return llama_msg
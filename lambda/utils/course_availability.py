@@ -0,0 +1,40 @@
+from .db_connection import transaction
+from .ttl_cache import TTLCache
+
+# Short enough that an instructor enabling student access is visible almost immediately
+AVAILABILITY_TTL_SECONDS = 30
+
+# Cached across warm invocations, {course_id: student_access_enabled}
+AVAILABILITY_CACHE = TTLCache(AVAILABILITY_TTL_SECONDS)
+
+def get_availabilities(course_ids):
+    """
+    Returns {course_id: student_access_enabled} for every course id, looking up the uncached ones in one query.
+    Courses without a configuration are unavailable. If the lookup fails the uncached courses are reported
+    unavailable, without caching that answer.
+    """
+    course_ids = [str(course_id) for course_id in course_ids]
+    availabilities = AVAILABILITY_CACHE.get_many(course_ids)
+    missing = [course_id for course_id in dict.fromkeys(course_ids) if course_id not in availabilities]
+    if not missing:
+        return availabilities
+
+    try:
+        query = """
+        SELECT course_id, student_access_enabled
+        FROM course_configuration
+        WHERE course_id = ANY(%s)
+        """
+        with transaction() as cursor:
+            cursor.execute(query, (missing,))
+            rows = dict(cursor.fetchall())
+    except Exception as e:
+        print(f"Error: {e}")
+        availabilities.update({course_id: False for course_id in missing})
+        return availabilities
+
+    for course_id in missing:
+        available = bool(rows.get(course_id, False))
+        AVAILABILITY_CACHE.put(course_id, available)
+        availabilities[course_id] = available
+    return availabilities
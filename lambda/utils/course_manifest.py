@@ -0,0 +1,132 @@
+import json
+import boto3
+from botocore.exceptions import ClientError
+
+# Manifests live outside the "{course_id}/" folders so that they are never ingested as course documents
+MANIFEST_PREFIX = "manifests"
+MANIFEST_VERSION = 1
+
+# File types that fetchReadFromS3 knows how to read
+SUPPORTED_EXTENSIONS = {"txt", "md", "c", "cpp", "css", "go", "py", "js", "rtf", "pdf", "docx", "html"}
+
+s3_client = boto3.client("s3")
+
+def get_manifest_key(course_id):
+    return f"{MANIFEST_PREFIX}/{course_id}.json"
+
+def get_extension(file_name):
+    parts = file_name.split(".")
+    extension = parts[-1]
+    return extension
+
+def is_eligible_file(file):
+    """
+    Whether a Canvas file should be synced into the course folder.
+    """
+    return (
+        file["locked"] == False
+        and file["upload_status"] == "success"
+        and file["hidden"] == False
+        and get_extension(file["display_name"]) in SUPPORTED_EXTENSIONS
+    )
+
+def build_manifest_entry(file):
+    """
+    The subset of a Canvas file that is needed to detect changes and to re-create its S3 metadata.
+    """
+    return {
+        "canvas_id": file.get("id"),
+        "display_name": file["display_name"],
+        "original_url": file["url"],
+        "updated_at": file["updated_at"],
+        "size": file.get("size"),
+    }
+
+def load_course_manifest(bucket_name, course_id):
+    """
+    Returns the manifest written by the last successful sync, or None if the course was never synced
+    (or the manifest cannot be read), in which case callers fall back to a full sync.
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=get_manifest_key(course_id))
+        manifest = json.loads(response["Body"].read().decode("utf-8"))
+        if manifest.get("version") != MANIFEST_VERSION:
+            print(f"Ignoring manifest for course {course_id} with version {manifest.get('version')}")
+            return None
+        return manifest
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "NoSuchKey":
+            print(f"Error reading manifest for course {course_id}: {e}")
+        return None
+    except Exception as e:
+        print(f"Error reading manifest for course {course_id}: {e}")
+        return None
+
+def save_course_manifest(bucket_name, course_id, files, included_content, pending_keys=None, pending_removed_keys=None):
+    """
+    Records the synced files ({s3_key: manifest entry}) and the content types they were ingested with.
+    Pending keys are files uploaded or removed in S3 whose vectors have not been updated yet.
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "includedCourseContent": included_content,
+        "files": files,
+        "pendingKeys": pending_keys or [],
+        "pendingRemovedKeys": pending_removed_keys or [],
+    }
+    try:
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=get_manifest_key(course_id),
+            Body=json.dumps(manifest).encode("utf-8"),
+            ContentType="application/json"
+        )
+        return "Manifest saved"
+    except Exception as e:
+        print(f"Error saving manifest for course {course_id}: {e}")
+        return None
+
+def diff_course_files(previous_files, current_files):
+    """
+    Compares two {s3_key: manifest entry} maps and returns the (added, modified, removed) S3 keys.
+    A file counts as modified when Canvas reports a different updated_at or size.
+    """
+    added = [key for key in current_files if key not in previous_files]
+    removed = [key for key in previous_files if key not in current_files]
+    modified = [
+        key for key, entry in current_files.items()
+        if key in previous_files and (
+            entry.get("updated_at") != previous_files[key].get("updated_at")
+            or entry.get("size") != previous_files[key].get("size")
+        )
+    ]
+    return added, modified, removed
+
+def list_course_object_keys(bucket_name, course_id):
+    """
+    Returns the keys of every file stored for the course, following the listing past 1000 keys.
+    """
+    prefix = f"{course_id}/"  # Folder for the course
+    keys = []
+    try:
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    except Exception as e:
+        print(f"Error listing files from S3: {e}")
+        return None
+    return keys
+
+def get_file_metadata(bucket_name, file_key, manifest_files=None):
+    """
+    Returns the display_name and original_url of a course file, from the manifest when it has the file
+    and from the object's S3 metadata otherwise.
+    """
+    entry = (manifest_files or {}).get(file_key)
+    if entry:
+        return {"display_name": entry["display_name"], "original_url": entry["original_url"]}
+    metadata = s3_client.head_object(Bucket=bucket_name, Key=file_key).get("Metadata", {})
+    return {
+        "display_name": metadata.get("display_name", file_key),
+        "original_url": metadata.get("original_url", "N/A"),
+    }
@@ -0,0 +1,78 @@
+import os
+import boto3
+from boto3.dynamodb.conditions import Key, Attr
+
+# Messages GSI: course_id + source_timestamp ("{msg_source}#{msg_timestamp}")
+COURSE_SOURCE_TIME_INDEX = "CourseSourceTimeIndex"
+# Sorts after every character of an ISO timestamp, closes open-ended time windows
+MAX_TIMESTAMP = "~"
+
+env_prefix = os.environ.get("ENV_PREFIX")
+dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+messages_table = dynamodb.Table(f"{env_prefix}Messages")
+
+def get_source_timestamp(msg_source, msg_timestamp):
+    return f"{msg_source}#{msg_timestamp}"
+
+def with_index_keys(message):
+    """
+    A copy of the message carrying the sort key of the course/source/time index.
+    """
+    return {
+        **message,
+        "source_timestamp": get_source_timestamp(message["msg_source"], message["msg_timestamp"]),
+    }
+
+def query_course_messages(course_id, msg_source, start_time, end_time=None, projection=None):
+    """
+    Messages of a course from one source (STUDENT, AI or SYSTEM) with start_time <= msg_timestamp <= end_time,
+    oldest first. Times are ISO timestamps, no end_time means up to now.
+    """
+    query_kwargs = {
+        "IndexName": COURSE_SOURCE_TIME_INDEX,
+        "KeyConditionExpression": Key("course_id").eq(str(course_id)) & Key("source_timestamp").between(
+            get_source_timestamp(msg_source, start_time),
+            get_source_timestamp(msg_source, end_time or MAX_TIMESTAMP)
+        ),
+    }
+    if projection:
+        # Attribute names are aliased since some of them (e.g. "references") are reserved words
+        names = {f"#a{i}": attribute for i, attribute in enumerate(projection)}
+        query_kwargs["ProjectionExpression"] = ", ".join(names)
+        query_kwargs["ExpressionAttributeNames"] = names
+
+    messages = []
+    while True:
+        response = messages_table.query(**query_kwargs)
+        messages.extend(response.get("Items", []))
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return messages
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+def backfill_index_keys(start_key=None, should_stop=None):
+    """
+    Adds source_timestamp to messages written before the index existed. Safe to run more than once.
+    Scans from start_key and stops early once should_stop() is true.
+    Returns (messages updated, key to resume from or None when done).
+    """
+    scan_kwargs = {"FilterExpression": Attr("source_timestamp").not_exists() & Attr("msg_timestamp").exists()}
+    if start_key:
+        scan_kwargs["ExclusiveStartKey"] = start_key
+    updated = 0
+    while True:
+        response = messages_table.scan(**scan_kwargs)
+        for message in response.get("Items", []):
+            if "msg_source" not in message or "course_id" not in message:
+                continue
+            messages_table.update_item(
+                Key={"message_id": message["message_id"]},
+                UpdateExpression="SET source_timestamp = :st",
+                ExpressionAttributeValues={":st": get_source_timestamp(message["msg_source"], message["msg_timestamp"])}
+            )
+            updated += 1
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key or (should_stop and should_stop()):
+            print(f"Backfilled {updated} messages")
+            return updated, last_evaluated_key
+        scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
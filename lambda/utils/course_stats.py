@@ -0,0 +1,259 @@
+import os
+import hashlib
+import boto3
+from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Key
+from .course_messages import query_course_messages
+from .scan_all_conversations import conversations_table, scan_all_conversations_for_course
+
+# A conversation counts as a student session once it holds more than the system and welcome messages
+SESSION_MIN_MESSAGES = 3
+
+env_prefix = os.environ.get("ENV_PREFIX")
+dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+# One item per course and UTC day: questionsAsked, studentSessions and the set of students active that day
+course_stats_table = dynamodb.Table(f"{env_prefix}CourseDailyStats")
+# One item per course, UTC day and referenced document ("{day}#{document hash}"): referenceCount
+material_stats_table = dynamodb.Table(f"{env_prefix}CourseMaterialStats")
+
+def get_day(timestamp=None):
+    """
+    The YYYY-MM-DD bucket of an ISO timestamp, today if none is given.
+    """
+    if timestamp:
+        return timestamp[:10]
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+def is_new_session(previous_count, message_count):
+    """
+    Whether appending messages took a conversation from previous_count to message_count messages
+    across the session threshold.
+    """
+    return previous_count < SESSION_MIN_MESSAGES <= message_count
+
+def record_turn(course_id, student_id, questions_asked, new_sessions, timestamp=None):
+    """
+    Adds one persisted turn to the course's counters for the day. Errors are logged and not raised,
+    the turn itself has already been stored.
+    """
+    update_expression = "ADD students :students"
+    values = {":students": {str(student_id)}}
+    if questions_asked:
+        update_expression += ", questionsAsked :questions"
+        values[":questions"] = questions_asked
+    if new_sessions:
+        update_expression += ", studentSessions :sessions"
+        values[":sessions"] = new_sessions
+    try:
+        course_stats_table.update_item(
+            Key={"course_id": str(course_id), "day": get_day(timestamp)},
+            UpdateExpression=update_expression,
+            ExpressionAttributeValues=values
+        )
+    except Exception as e:
+        print(f"Failed to update course stats: {e}")
+
+def get_engagement_stats(course_id, start_time, end_time=None):
+    """
+    Sums the daily buckets of a course from the day of start_time to the day of end_time (today by default).
+    """
+    response_items = []
+    query_kwargs = {
+        "KeyConditionExpression": Key("course_id").eq(str(course_id)) & Key("day").between(get_day(start_time), get_day(end_time))
+    }
+    while True:
+        response = course_stats_table.query(**query_kwargs)
+        response_items.extend(response.get("Items", []))
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    unique_students = set()
+    for item in response_items:
+        unique_students.update(item.get("students", set()))
+    return {
+        "questionsAsked": int(sum(item.get("questionsAsked", 0) for item in response_items)),
+        "studentSessions": int(sum(item.get("studentSessions", 0) for item in response_items)),
+        "uniqueStudents": len(unique_students),
+    }
+
+def list_conversation_courses():
+    """
+    Sorted ids of every course that has a conversation.
+    """
+    course_ids = set()
+    scan_kwargs = {"ProjectionExpression": "course_id"}
+    while True:
+        response = conversations_table.scan(**scan_kwargs)
+        course_ids.update(item["course_id"] for item in response.get("Items", []) if "course_id" in item)
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return sorted(course_ids)
+        scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+def compute_engagement_days(course_id):
+    """
+    Rebuilds {day: {"questionsAsked", "studentSessions", "students"}} of a course from its messages and
+    conversations, counted the way record_turn counts them.
+    """
+    days = {}
+    def get_bucket(day):
+        return days.setdefault(day, {"questionsAsked": 0, "studentSessions": 0, "students": set()})
+
+    # Every turn is stamped with its first message: SYSTEM for the welcome turn, STUDENT for the others
+    student_message_days = {}
+    for msg_source in ("SYSTEM", "STUDENT"):
+        messages = query_course_messages(course_id, msg_source, "", projection=["message_id", "msg_timestamp", "student_id"])
+        for message in messages:
+            day = get_day(message["msg_timestamp"])
+            bucket = get_bucket(day)
+            if "student_id" in message:
+                bucket["students"].add(str(message["student_id"]))
+            if msg_source == "STUDENT":
+                bucket["questionsAsked"] += 1
+                student_message_days[message["message_id"]] = day
+
+    # A session starts with the turn that appends the SESSION_MIN_MESSAGES-th message
+    for conversation in scan_all_conversations_for_course(course_id):
+        message_list = conversation.get("message_list", [])
+        if len(message_list) < SESSION_MIN_MESSAGES:
+            continue
+        day = student_message_days.get(message_list[SESSION_MIN_MESSAGES - 1]) or get_day(conversation.get("time_created"))
+        get_bucket(day)["studentSessions"] += 1
+    return days
+
+def backfill_courses(write_course, start_key=None, should_stop=None):
+    """
+    Calls write_course(course_id, today) for every course with conversations, in course id order, and sums
+    the items it returns having written. Resumes from the course in start_key and stops between courses
+    once should_stop() is true.
+    Returns (items written, key to resume from or None when done).
+    """
+    today = get_day()
+    course_ids = list_conversation_courses()
+    if start_key:
+        course_ids = [course_id for course_id in course_ids if course_id >= start_key["course_id"]]
+
+    updated = 0
+    for i, course_id in enumerate(course_ids):
+        if i and should_stop and should_stop():
+            print(f"Backfilled {updated} items")
+            return updated, {"course_id": course_id}
+        updated += write_course(course_id, today)
+    print(f"Backfilled {updated} items")
+    return updated, None
+
+def write_engagement_days(course_id, today):
+    """
+    Overwrites the daily counters of a course before today with the ones rebuilt from its messages.
+    """
+    written = 0
+    for day, stats in compute_engagement_days(course_id).items():
+        if day >= today:
+            continue
+        item = {
+            "course_id": course_id,
+            "day": day,
+            "questionsAsked": stats["questionsAsked"],
+            "studentSessions": stats["studentSessions"],
+        }
+        # DynamoDB sets cannot be empty
+        if stats["students"]:
+            item["students"] = stats["students"]
+        course_stats_table.put_item(Item=item)
+        written += 1
+    return written
+
+def backfill_engagement_stats(start_key=None, should_stop=None):
+    """
+    Rebuilds the daily counters of every course with conversations, for the days before today (today's are
+    still being written by record_turn). Overwrites the rebuilt days, so it is safe to run more than once.
+    Needs the messageIndex backfill to have run.
+    """
+    return backfill_courses(write_engagement_days, start_key, should_stop)
+
+def get_document_hash(document_name, source_url):
+    return hashlib.sha256(f"{document_name}\n{source_url}".encode("utf-8")).hexdigest()[:32]
+
+def count_references(references):
+    """
+    {(documentName, sourceUrl): number of retrieved chunks} for the references of one AI message.
+    """
+    counts = {}
+    for source in references or []:
+        doc_url = source.get("sourceUrl")
+        doc_name = source.get("documentName")
+        if doc_name and doc_url:
+            counts[(doc_name, doc_url)] = counts.get((doc_name, doc_url), 0) + 1
+    return counts
+
+def record_reference(course_id, doc_name, doc_url, count, timestamp=None):
+    """
+    Adds count references to one document to the course's counters for the day.
+    Errors are logged and not raised.
+    """
+    try:
+        material_stats_table.update_item(
+            Key={"course_id": str(course_id), "day_document": f"{get_day(timestamp)}#{get_document_hash(doc_name, doc_url)}"},
+            UpdateExpression="SET documentName = :name, sourceUrl = :url ADD referenceCount :count",
+            ExpressionAttributeValues={":name": doc_name, ":url": doc_url, ":count": count}
+        )
+    except Exception as e:
+        print(f"Failed to update material stats: {e}")
+
+def write_material_days(course_id, today):
+    """
+    Overwrites the reference counters of a course before today with the ones rebuilt from its AI messages.
+    """
+    counts = {}
+    for message in query_course_messages(course_id, "AI", "", projection=["msg_timestamp", "references_en"]):
+        day = get_day(message["msg_timestamp"])
+        if day >= today:
+            continue
+        for material, count in count_references(message.get("references_en")).items():
+            counts[(day, material)] = counts.get((day, material), 0) + count
+
+    with material_stats_table.batch_writer() as batch:
+        for (day, (doc_name, doc_url)), count in counts.items():
+            batch.put_item(Item={
+                "course_id": course_id,
+                "day_document": f"{day}#{get_document_hash(doc_name, doc_url)}",
+                "documentName": doc_name,
+                "sourceUrl": doc_url,
+                "referenceCount": count,
+            })
+    return len(counts)
+
+def backfill_material_stats(start_key=None, should_stop=None):
+    """
+    Rebuilds the reference counters of every course with conversations, for the days before today.
+    Overwrites the rebuilt days, so it is safe to run more than once. Needs the messageIndex backfill to have run.
+    """
+    return backfill_courses(write_material_days, start_key, should_stop)
+
+def get_top_materials(course_id, num, start_time, end_time=None):
+    """
+    The num documents of a course referenced most between the days of start_time and end_time (today by default),
+    as [((documentName, sourceUrl), referenceCount)].
+    """
+    items = []
+    query_kwargs = {
+        "KeyConditionExpression": Key("course_id").eq(str(course_id)) & Key("day_document").between(
+            f"{get_day(start_time)}#", f"{get_day(end_time)}#~"
+        ),
+        "ProjectionExpression": "documentName, sourceUrl, referenceCount",
+    }
+    while True:
+        response = material_stats_table.query(**query_kwargs)
+        items.extend(response.get("Items", []))
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    counts = {}
+    for item in items:
+        material = (item["documentName"], item["sourceUrl"])
+        counts[material] = counts.get(material, 0) + int(item.get("referenceCount", 0))
+    return sorted(counts.items(), key=lambda x: x[1], reverse=True)[:num]
@@ -1,16 +1,12 @@
 import psycopg2
 import psycopg2.extras
+from .db_connection import transaction
 
-def create_table_if_not_exists(DB_CONFIG):
+def create_table_if_not_exists():
     """
     Ensure the embeddings table exists in the database.
     """
-    connection = None
-    
     try:
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-
         create_course_config_query = """
         CREATE TABLE IF NOT EXISTS course_configuration (
             course_id TEXT PRIMARY KEY,                         -- Unique ID for the course
@@ -23,12 +19,8 @@ def create_table_if_not_exists(DB_CONFIG):
             auto_update_on BOOLEAN DEFAULT FALSE
         );
         """
-        cursor.execute(create_course_config_query)
-        connection.commit()
-        cursor.close()
+        with transaction() as cursor:
+            cursor.execute(create_course_config_query)
         return "DBSuccess"
     except Exception as e:
         print(f"Error creating table: {e}")
-    finally:
-        if connection:
-            connection.close()
\ No newline at end of file
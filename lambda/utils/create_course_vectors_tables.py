@@ -1,35 +1,222 @@
+import os
 import psycopg2
 import psycopg2.extras
-def create_table_if_not_exists(DB_CONFIG, course_id):
+from .db_connection import transaction
+
+# Approximate nearest neighbour index used for retrieval: "hnsw" or "ivfflat"
+VECTOR_INDEX_METHOD = os.environ.get("VECTOR_INDEX_METHOD", "hnsw")
+# Distance used both by the index and by get_course_vector: "l2", "cosine" or "inner_product"
+VECTOR_DISTANCE = os.environ.get("VECTOR_DISTANCE", "l2")
+
+# Maps each distance to its pgvector operator class and query operator
+DISTANCE_OPERATORS = {
+    "l2": ("vector_l2_ops", "<->"),
+    "cosine": ("vector_cosine_ops", "<=>"),
+    "inner_product": ("vector_ip_ops", "<#>"),
+}
+
+# HNSW build parameters (pgvector defaults)
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+# IVFFlat uses one list per this many rows, as recommended by pgvector for tables up to 1M rows
+IVFFLAT_ROWS_PER_LIST = 1000
+
+# How long the swap may wait for queries still running on the live table before giving up
+SWAP_LOCK_TIMEOUT = "10s"
+
+# Columns added after the first release, with their definitions
+ADDED_COLUMNS = [
+    ("content_hash", "TEXT UNIQUE"),
+    # S3 key of the source file, or "canvas:<CONTENT TYPE>" for Canvas content, used by incremental syncs
+    ("document_key", "TEXT"),
+    # Page a PDF chunk starts on, NULL for other documents
+    ("page_number", "INTEGER"),
+]
+
+def get_shadow_table_id(course_id):
+    """
+    Full refreshes are built into course_vectors_{course_id}_shadow. Every helper in utils formats
+    course_vectors_{course_id}, so the shadow table is addressed by passing this id as the course id.
+    """
+    return f"{course_id}_shadow"
+
+def create_vectors_table(cursor, course_id, with_ann_index=True):
+    """
+    Creates course_vectors_{course_id} with its indexes if it doesn't exist, migrating older tables.
+    """
+    # Ensure the extension is created
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    cursor.execute("SELECT to_regclass(%s);", (f"course_vectors_{course_id}",))
+    is_new_table = cursor.fetchone()[0] is None
+
+    create_embeddings_query = f"""
+    CREATE TABLE IF NOT EXISTS course_vectors_{course_id} (
+        id SERIAL PRIMARY KEY,
+        document_name TEXT NOT NULL,
+        embeddings VECTOR(1024),
+        created_at TIMESTAMP DEFAULT NOW(),
+        sourceURL TEXT DEFAULT 'https://www.example.com',
+        document_content TEXT,
+        content_hash TEXT UNIQUE,
+        document_key TEXT,
+        page_number INTEGER
+    );
+    """
+    cursor.execute(create_embeddings_query)
+    # Tables created before these columns were introduced get them on first use
+    for column_name, column_definition in ADDED_COLUMNS:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s;",
+            (f"course_vectors_{course_id}", column_name)
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE course_vectors_{course_id} ADD COLUMN IF NOT EXISTS {column_name} {column_definition};")
+    ensure_document_key_index(cursor, course_id)
+
+    # HNSW can be built on an empty table and is maintained on insert, IVFFlat is built after loading.
+    # Existing tables get their index from maintain_vector_index when the course is refreshed
+    if with_ann_index and is_new_table and VECTOR_INDEX_METHOD == "hnsw":
+        ensure_vector_index(cursor, course_id, "hnsw", VECTOR_DISTANCE)
+
+def create_table_if_not_exists(course_id):
     """
     Dynamically create a table for the given course ID if it doesn't exist.
     """
-    connection = None
     try:
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-
-        # Dynamically construct table creation query
-        # Ensure the extension is created
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-
-        create_embeddings_query = f"""
-        CREATE TABLE IF NOT EXISTS course_vectors_{course_id} (
-            id SERIAL PRIMARY KEY,
-            document_name TEXT NOT NULL,
-            embeddings VECTOR(1024),
-            created_at TIMESTAMP DEFAULT NOW(),
-            sourceURL TEXT DEFAULT 'https://www.example.com',
-            document_content TEXT
-        );
-        """
-        cursor.execute(create_embeddings_query)
-        connection.commit()
-        cursor.close()
+        with transaction() as cursor:
+            create_vectors_table(cursor, course_id)
         return "Table created or already exists"
     except Exception as e:
         print(f"Error creating table: {e}")
         return "Error creating table"
-    finally:
-        if connection:
-            connection.close()
\ No newline at end of file
+
+def create_shadow_table(connection, course_id):
+    """
+    Starts a new generation of the course vectors in an empty shadow table, discarding any
+    leftover from an interrupted refresh. The ANN index is only built once the table is loaded.
+    """
+    shadow_id = get_shadow_table_id(course_id)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS course_vectors_{shadow_id};")
+            create_vectors_table(cursor, shadow_id, with_ann_index=False)
+        connection.commit()
+        return shadow_id
+    except Exception as e:
+        connection.rollback()
+        print(f"Error creating shadow table: {e}")
+        return None
+
+def swap_shadow_table(connection, course_id):
+    """
+    Atomically replaces course_vectors_{course_id} with its shadow table. Both renames and the drop of the
+    previous generation happen in one transaction, so queries see either the old or the new table in full.
+    """
+    shadow_id = get_shadow_table_id(course_id)
+    try:
+        with connection.cursor() as cursor:
+            # Renaming waits for in-flight queries on the live table, don't queue retrieval behind it for long
+            cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}';")
+            cursor.execute(f"DROP TABLE IF EXISTS course_vectors_{course_id}_previous;")
+            cursor.execute(f"ALTER TABLE IF EXISTS course_vectors_{course_id} RENAME TO course_vectors_{course_id}_previous;")
+            cursor.execute(f"ALTER TABLE course_vectors_{shadow_id} RENAME TO course_vectors_{course_id};")
+            cursor.execute(f"DROP TABLE IF EXISTS course_vectors_{course_id}_previous;")
+        connection.commit()
+        print(f"Swapped in the new generation of course_vectors_{course_id}")
+        return "Table swapped"
+    except Exception as e:
+        connection.rollback()
+        print(f"Error swapping shadow table: {e}")
+        return None
+
+def drop_shadow_table(connection, course_id):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS course_vectors_{get_shadow_table_id(course_id)};")
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        print(f"Error dropping shadow table: {e}")
+
+def ensure_document_key_index(cursor, course_id):
+    """
+    Indexes document_key so that incremental syncs can replace or remove one document at a time.
+    """
+    cursor.execute(
+        "SELECT 1 FROM pg_indexes WHERE tablename = %s AND indexdef ILIKE '%%(document_key)%%';",
+        (f"course_vectors_{course_id}",)
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(f"CREATE INDEX ON course_vectors_{course_id} (document_key);")
+
+def find_vector_indexes(cursor, course_id):
+    """
+    Returns (index_name, index_definition) for every ANN index on the course's embeddings column.
+    """
+    cursor.execute(
+        """
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE tablename = %s AND (indexdef ILIKE '%%USING hnsw%%' OR indexdef ILIKE '%%USING ivfflat%%');
+        """,
+        (f"course_vectors_{course_id}",)
+    )
+    return cursor.fetchall()
+
+def ensure_vector_index(cursor, course_id, method=VECTOR_INDEX_METHOD, distance=VECTOR_DISTANCE, rebuild=False):
+    """
+    Makes sure the course table has exactly one ANN index of the given method and distance.
+    Indexes of another method or distance are dropped. With rebuild=True an existing matching
+    index is rebuilt, which IVFFlat needs after bulk loads since its lists are fixed at build time.
+    """
+    if method not in ("hnsw", "ivfflat"):
+        raise ValueError(f"Unsupported vector index method: {method}")
+    if distance not in DISTANCE_OPERATORS:
+        raise ValueError(f"Unsupported vector distance: {distance}")
+    operator_class = DISTANCE_OPERATORS[distance][0]
+
+    matching_index = None
+    for index_name, index_definition in find_vector_indexes(cursor, course_id):
+        if f"USING {method}" in index_definition and operator_class in index_definition and matching_index is None:
+            matching_index = index_name
+        else:
+            cursor.execute(f'DROP INDEX IF EXISTS "{index_name}";')
+
+    if matching_index and not rebuild:
+        return matching_index
+    if matching_index:
+        cursor.execute(f'DROP INDEX IF EXISTS "{matching_index}";')
+
+    if method == "hnsw":
+        cursor.execute(
+            f"""
+            CREATE INDEX ON course_vectors_{course_id}
+            USING hnsw (embeddings {operator_class}) WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION});
+            """
+        )
+    else:
+        cursor.execute(f"SELECT COUNT(*) FROM course_vectors_{course_id};")
+        row_count = cursor.fetchone()[0]
+        lists = max(1, row_count // IVFFLAT_ROWS_PER_LIST)
+        cursor.execute(
+            f"""
+            CREATE INDEX ON course_vectors_{course_id}
+            USING ivfflat (embeddings {operator_class}) WITH (lists = {lists});
+            """
+        )
+    print(f"Created {method} index ({distance}) on course_vectors_{course_id}")
+    return None
+
+def maintain_vector_index(connection, course_id, method=VECTOR_INDEX_METHOD, distance=VECTOR_DISTANCE):
+    """
+    Brings the ANN index up to date after an ingestion run and refreshes planner statistics.
+    """
+    try:
+        with connection.cursor() as cursor:
+            ensure_vector_index(cursor, course_id, method, distance, rebuild=(method == "ivfflat"))
+            cursor.execute(f"ANALYZE course_vectors_{course_id};")
+        connection.commit()
+        return "Index maintained"
+    except Exception as e:
+        connection.rollback()
+        print(f"Error maintaining vector index: {e}")
+        return "Error maintaining vector index"
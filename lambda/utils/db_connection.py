@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.pool
+from .get_rds_secret import get_cached_secret, load_db_config, invalidate_db_credentials
+
+# Connections kept open per execution environment. Borrowers beyond this wait for a free connection
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = int(os.environ.get("DB_POOL_MAX_CONNECTIONS", 8))
+CONNECT_TIMEOUT_SECONDS = 5
+# Borrowers waiting longer than this for a free connection fail instead of blocking until the Lambda times out
+POOL_ACQUIRE_TIMEOUT_SECONDS = int(os.environ.get("DB_POOL_ACQUIRE_TIMEOUT_SECONDS", 60))
+# Connections idle for longer than this (e.g. across frozen invocations) are checked before being handed out
+HEALTH_CHECK_IDLE_SECONDS = 30
+
+# Cached across warm invocations
+CONNECTION_POOL = None
+pool_lock = threading.Lock()
+pool_slots = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+last_used = {}
+
+
+def get_db_config():
+    """
+    Connection parameters for the RDS proxy, combining the static config with the database credentials.
+    """
+    credentials = get_cached_secret()
+    static_db_config = load_db_config()
+    return {
+        **static_db_config,
+        "user": credentials['username'],
+        "password": credentials['password'],
+        "connect_timeout": CONNECT_TIMEOUT_SECONDS,
+    }
+
+
+def is_authentication_error(error):
+    message = str(error).lower()
+    return "authentication failed" in message
+
+
+def create_connection_pool():
+    return psycopg2.pool.ThreadedConnectionPool(
+        POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **get_db_config()
+    )
+
+
+def get_connection_pool():
+    global CONNECTION_POOL
+    with pool_lock:
+        if CONNECTION_POOL is None or CONNECTION_POOL.closed:
+            print("Creating database connection pool")
+            try:
+                CONNECTION_POOL = create_connection_pool()
+            except psycopg2.OperationalError as e:
+                if not is_authentication_error(e):
+                    raise
+                # The secret was probably rotated since it was cached
+                print("Database authentication failed, reloading credentials")
+                invalidate_db_credentials()
+                CONNECTION_POOL = create_connection_pool()
+        return CONNECTION_POOL
+
+
+def reset_connection_pool():
+    """
+    Closes every pooled connection, the next borrower opens a new pool.
+    """
+    global CONNECTION_POOL
+    with pool_lock:
+        if CONNECTION_POOL is not None and not CONNECTION_POOL.closed:
+            CONNECTION_POOL.closeall()
+        CONNECTION_POOL = None
+        last_used.clear()
+
+
+def is_connection_healthy(connection):
+    if connection.closed:
+        return False
+    # Connections the pool just opened have no entry yet and need no check
+    idle_since = last_used.get(id(connection))
+    if idle_since is None or time.monotonic() - idle_since < HEALTH_CHECK_IDLE_SECONDS:
+        return True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+        connection.rollback()
+        return True
+    except psycopg2.Error as e:
+        print(f"Discarding broken database connection: {e}")
+        return False
+
+
+def borrow_connection(pool):
+    """
+    Takes a connection from the pool, replacing it once if it turns out to be broken.
+    """
+    try:
+        connection = pool.getconn()
+    except psycopg2.OperationalError as e:
+        if is_authentication_error(e):
+            # Credentials rotated while the pool was open: the next borrower builds a pool with the new secret
+            invalidate_db_credentials()
+            reset_connection_pool()
+        raise
+    if not is_connection_healthy(connection):
+        pool.putconn(connection, close=True)
+        connection = pool.getconn()
+    return connection
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrows a pooled connection for the duration of the block. Open transactions are rolled back
+    when it is returned, and connections that failed at the connection level are discarded.
+    """
+    if not pool_slots.acquire(timeout=POOL_ACQUIRE_TIMEOUT_SECONDS):
+        raise psycopg2.pool.PoolError(
+            f"No database connection freed up within {POOL_ACQUIRE_TIMEOUT_SECONDS}s, "
+            f"all {POOL_MAX_CONNECTIONS} pooled connections are in use"
+        )
+    try:
+        pool = get_connection_pool()
+        connection = borrow_connection(pool)
+        try:
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            pool.putconn(connection, close=True)
+            connection = None
+            raise
+        finally:
+            if connection is not None:
+                last_used[id(connection)] = time.monotonic()
+                # The pool rolls back unfinished transactions and closes connections in an unknown state
+                pool.putconn(connection, close=connection.closed)
+    finally:
+        pool_slots.release()
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the block in one transaction on a pooled connection and yields a cursor.
+    Commits when the block completes and rolls back if it raises.
+    """
+    with get_connection() as connection:
+        try:
+            with connection.cursor() as cursor:
+                yield cursor
+            connection.commit()
+        except Exception:
+            if not connection.closed:
+                connection.rollback()
+            raise
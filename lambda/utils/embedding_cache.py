@@ -0,0 +1,172 @@
+import os
+import json
+import psycopg2
+import psycopg2.extras
+from .generate_embeddings import EMBEDDING_MODEL_ID, embed_chunks
+from .store_course_vectors import compute_content_hash, format_vector
+
+# Rows sent to PostgreSQL per statement when reading or writing the cache
+CACHE_PAGE_SIZE = 500
+
+# Entries older than this are evicted, so the cache only holds chunks embedded or seeded recently
+CACHE_MAX_AGE_DAYS = int(os.environ.get("EMBEDDING_CACHE_MAX_AGE_DAYS", 30))
+
+# The cache table only needs to be created once per execution environment
+CACHE_TABLE_READY = False
+
+def create_embedding_cache_table(connection):
+    """
+    Creates the embedding cache shared by all courses. Entries are keyed by chunk content hash and model id,
+    so identical chunks are only ever embedded once per model.
+    """
+    global CACHE_TABLE_READY
+    if CACHE_TABLE_READY:
+        return "Table created or already exists"
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    content_hash TEXT NOT NULL,
+                    model_id TEXT NOT NULL,
+                    embeddings VECTOR(1024) NOT NULL,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (content_hash, model_id)
+                );
+                """
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS embedding_cache_created_at_idx ON embedding_cache (created_at);")
+        connection.commit()
+        CACHE_TABLE_READY = True
+        return "Table created or already exists"
+    except Exception as e:
+        connection.rollback()
+        print(f"Error creating embedding cache table: {e}")
+        return "Error creating table"
+
+def get_cached_embeddings(connection, content_hashes, model_id=EMBEDDING_MODEL_ID):
+    """
+    Returns {content_hash: embedding} for every hash found in the cache.
+    """
+    cached = {}
+    if not content_hashes:
+        return cached
+    hashes = list(content_hashes)
+    try:
+        with connection.cursor() as cursor:
+            for i in range(0, len(hashes), CACHE_PAGE_SIZE):
+                cursor.execute(
+                    """
+                    SELECT content_hash, embeddings::text FROM embedding_cache
+                    WHERE model_id = %s AND content_hash = ANY(%s);
+                    """,
+                    (model_id, hashes[i:i + CACHE_PAGE_SIZE])
+                )
+                for content_hash, embedding in cursor.fetchall():
+                    cached[content_hash] = json.loads(embedding)
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        print(f"Error reading embedding cache: {e}")
+    return cached
+
+def put_cached_embeddings(connection, embeddings_by_hash, model_id=EMBEDDING_MODEL_ID):
+    """
+    Stores {content_hash: embedding} in the cache, leaving existing entries untouched.
+    """
+    if not embeddings_by_hash:
+        return 0
+    values = [
+        (content_hash, model_id, format_vector(embedding))
+        for content_hash, embedding in embeddings_by_hash.items()
+    ]
+    try:
+        with connection.cursor() as cursor:
+            psycopg2.extras.execute_values(
+                cursor,
+                """
+                INSERT INTO embedding_cache (content_hash, model_id, embeddings)
+                VALUES %s
+                ON CONFLICT (content_hash, model_id) DO NOTHING;
+                """,
+                values,
+                template="(%s, %s, %s::vector)",
+                page_size=CACHE_PAGE_SIZE
+            )
+        connection.commit()
+        return len(values)
+    except Exception as e:
+        connection.rollback()
+        print(f"Error writing embedding cache: {e}")
+        return 0
+
+def seed_embedding_cache(connection, course_id, model_id=EMBEDDING_MODEL_ID):
+    """
+    Adds the embeddings already stored for a course to the cache, so that rebuilding the course
+    from scratch does not embed its unchanged chunks again.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO embedding_cache (content_hash, model_id, embeddings)
+                SELECT content_hash, %s, embeddings FROM course_vectors_{course_id}
+                WHERE content_hash IS NOT NULL AND embeddings IS NOT NULL
+                ON CONFLICT (content_hash, model_id) DO NOTHING;
+                """,
+                (model_id,)
+            )
+            seeded = cursor.rowcount
+        connection.commit()
+        return seeded
+    except Exception as e:
+        connection.rollback()
+        print(f"Error seeding embedding cache: {e}")
+        return 0
+
+def expire_embedding_cache(connection, max_age_days=CACHE_MAX_AGE_DAYS):
+    """
+    Deletes the cache entries older than max_age_days. Returns the number of entries deleted.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM embedding_cache WHERE created_at < NOW() - make_interval(days => %s);",
+                (max_age_days,)
+            )
+            expired = cursor.rowcount
+        connection.commit()
+        return expired
+    except Exception as e:
+        connection.rollback()
+        print(f"Error expiring embedding cache: {e}")
+        return 0
+
+def embed_chunks_with_cache(connection, chunks, model_id=EMBEDDING_MODEL_ID):
+    """
+    Same contract as embed_chunks, but only chunks missing from the cache are sent to Bedrock.
+    """
+    if not chunks:
+        return []
+    content_hashes = [compute_content_hash(chunk) for chunk in chunks]
+    cached = get_cached_embeddings(connection, set(content_hashes), model_id)
+
+    # Embed each distinct missing chunk once, even if it repeats within the document
+    missing = {}
+    for content_hash, chunk in zip(content_hashes, chunks):
+        if content_hash not in cached and content_hash not in missing:
+            missing[content_hash] = chunk
+
+    if missing:
+        new_embeddings = embed_chunks(list(missing.values()))
+        fresh = {
+            content_hash: embedding
+            for content_hash, embedding in zip(missing.keys(), new_embeddings)
+            if embedding
+        }
+        put_cached_embeddings(connection, fresh, model_id)
+        cached.update(fresh)
+
+    print(f"Embedding cache: {len(set(content_hashes)) - len(missing)} hits, {len(missing)} misses")
+    return [cached.get(content_hash) for content_hash in content_hashes]
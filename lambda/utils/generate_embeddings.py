@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import random
+import threading
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+
+# Upper bound of concurrent Bedrock calls, and how far the pool may shrink when throttled
+MAX_EMBEDDING_WORKERS = 8
+MIN_EMBEDDING_WORKERS = 1
+# Number of consecutive successes needed before the pool grows by one worker again
+SUCCESSES_BEFORE_GROWTH = 10
+MAX_EMBEDDING_ATTEMPTS = 5
+BASE_BACKOFF_SECONDS = 0.5
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+bedrock = boto3.client("bedrock-runtime", region_name=os.getenv('AWS_REGION'))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Bounds the number of in-flight Bedrock calls. The limit is halved whenever a call is throttled
+    and grows back by one worker after a run of successful calls (AIMD).
+    """
+
+    def __init__(self, max_limit=MAX_EMBEDDING_WORKERS, min_limit=MIN_EMBEDDING_WORKERS):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self.successes = 0
+                print(f"Embedding calls throttled, concurrency reduced to {self.limit}")
+            else:
+                self.successes += 1
+                if self.successes >= SUCCESSES_BEFORE_GROWTH and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+
+# Shared by every caller in this execution environment so that concurrent files do not multiply the load
+embedding_limiter = AdaptiveConcurrencyLimiter()
+
+
+def is_throttling_error(error):
+    error_code = getattr(error, "response", {}).get("Error", {}).get("Code", "")
+    return error_code in THROTTLING_ERROR_CODES
+
+
+def invoke_embedding_model(text):
+    """
+    Calls the Titan embedding model once. Errors are raised so that callers can decide whether to retry.
+    """
+    response = bedrock.invoke_model(
+        modelId=EMBEDDING_MODEL_ID,
+        body=json.dumps({"inputText": text}),
+        contentType="application/json",
+        accept="application/json"
+    )
+    response_body = json.loads(response["body"].read().decode("utf-8"))
+    return response_body.get("embedding")
+
+
+def generate_embeddings(text, limiter=embedding_limiter):
+    """
+    Generates the embedding of a single chunk, retrying with jittered exponential backoff.
+    Returns None if the chunk could not be embedded.
+    """
+    for attempt in range(1, MAX_EMBEDDING_ATTEMPTS + 1):
+        limiter.acquire()
+        throttled = False
+        try:
+            return invoke_embedding_model(text)
+        except Exception as e:
+            throttled = is_throttling_error(e)
+            print(f"Error invoking model (attempt {attempt}/{MAX_EMBEDDING_ATTEMPTS}): {str(e)}")
+        finally:
+            limiter.release(throttled=throttled)
+
+        if attempt < MAX_EMBEDDING_ATTEMPTS:
+            time.sleep(BASE_BACKOFF_SECONDS * (2 ** (attempt - 1)) * (1 + random.random()))
+    return None
+
+
+def embed_chunks(chunks, max_workers=MAX_EMBEDDING_WORKERS):
+    """
+    Embeds a list of chunks in parallel. The result list is aligned with the input,
+    with None in place of any chunk that failed after all retries.
+    """
+    if not chunks:
+        return []
+    if len(chunks) == 1:
+        return [generate_embeddings(chunks[0])]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        return list(executor.map(generate_embeddings, chunks))
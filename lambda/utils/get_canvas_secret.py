@@ -1,20 +1,20 @@
 import os
+import json
 import boto3
+from .ttl_cache import TTLCache
 
-def get_secret():
-    secret_name = "CanvasSecrets"
-    region_name = os.getenv('AWS_REGION')
+SECRET_NAME = "CanvasSecrets"
+SECRET_TTL_SECONDS = int(os.environ.get("SECRET_TTL_SECONDS", 900))
+
+# Cached across warm invocations, refreshed ahead of expiry so that rotated keys are picked up
+SECRET_CACHE = TTLCache(SECRET_TTL_SECONDS)
 
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region_name
-    )
+secrets_client = boto3.client('secretsmanager', region_name=os.getenv('AWS_REGION'))
 
+def fetch_secret():
     try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=secret_name
+        get_secret_value_response = secrets_client.get_secret_value(
+            SecretId=SECRET_NAME
         )
     except Exception as e:
         # For a list of exceptions thrown, see
@@ -22,4 +22,16 @@ def get_secret():
         raise e
 
     secret = get_secret_value_response['SecretString']
-    return secret
\ No newline at end of file
+    return secret
+
+def get_secret():
+    return SECRET_CACHE.get(SECRET_NAME, fetch_secret)
+
+def get_canvas_credentials():
+    """
+    The Canvas credentials as a dict, read through the cache.
+    """
+    return json.loads(get_secret())
+
+def invalidate_canvas_secret():
+    SECRET_CACHE.invalidate(SECRET_NAME)
@@ -1,37 +1,51 @@
 import psycopg2
+from .create_course_vectors_tables import DISTANCE_OPERATORS, VECTOR_DISTANCE
+from .db_connection import transaction
 
-def get_course_vector(DB_CONFIG, query, course_id, num_max_results):
-    # Connect to the PostgreSQL database
+# Query-time recall knobs: larger values trade latency for recall
+HNSW_EF_SEARCH = 40
+IVFFLAT_PROBES = 10
+
+def get_course_vector(query, course_id, num_max_results, distance=VECTOR_DISTANCE,
+                      ef_search=HNSW_EF_SEARCH, probes=IVFFLAT_PROBES):
     try:
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
+        # Any other operator cannot use the ANN index and would scan the whole table
+        if distance != VECTOR_DISTANCE:
+            raise ValueError(f"Unsupported vector distance: {distance}, the index uses {VECTOR_DISTANCE}")
+        distance_operator = DISTANCE_OPERATORS[distance][1]
 
         # Query the vector database with explicit casting
         query_vectors_sql = f"""
-        SELECT document_name, sourceURL, document_content, embeddings <-> %s::vector AS similarity
+        SELECT document_name, sourceURL, document_content, page_number, embeddings {distance_operator} %s::vector AS similarity
         FROM course_vectors_{course_id}
         ORDER BY similarity
         LIMIT %s;
         """
         # Ensure the query is passed as a string formatted like '[0.1, 0.2, 0.3]'
         formatted_query = f"[{', '.join(map(str, query))}]"  # Format the query embedding
-        cursor.execute(query_vectors_sql, (formatted_query, num_max_results))
-        rows = cursor.fetchall()
+
+        with transaction() as cursor:
+            # Scoped to this transaction; HNSW cannot return more rows than ef_search
+            cursor.execute("SET LOCAL hnsw.ef_search = %s;", (max(int(ef_search), int(num_max_results)),))
+            cursor.execute("SET LOCAL ivfflat.probes = %s;", (int(probes),))
+            cursor.execute(query_vectors_sql, (formatted_query, num_max_results))
+            rows = cursor.fetchall()
 
         results = [
             {
                 "documentName": row[0],
                 "sourceUrl": row[1],  # Add source_url to the result
                 "documentContent": row[2],
-                # "similarity": row[3]
+                "pageNumber": row[3],
+                # "similarity": row[4]
             }
             for row in rows
         ]
 
-        cursor.close()
-        connection.close()
-
         return results
+    except psycopg2.errors.UndefinedTable:
+        # The course has not been ingested yet
+        return []
     except Exception as e:
         print(f"Error querying vectors: {e}")
-        return "cannot connect to db"
\ No newline at end of file
+        return "cannot connect to db"
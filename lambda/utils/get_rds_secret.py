@@ -1,29 +1,38 @@
 import os
 import json
 import boto3
+from .ttl_cache import TTLCache
 
-# Caching secrets and DB connection
-SECRET_CACHE = None
+# Secrets are re-read well within the rotation window so that a rotated password is picked up without a cold start
+SECRET_TTL_SECONDS = int(os.environ.get("SECRET_TTL_SECONDS", 900))
+# The proxy endpoint only changes if the proxy is re-created
+ENDPOINT_TTL_SECONDS = 3600
 
-def get_cached_secret():
-    global SECRET_CACHE
-    if SECRET_CACHE is None:
-        SECRET_CACHE = get_secret()  # Call only once
-    return json.loads(SECRET_CACHE)
+# Cached across warm invocations
+SECRET_CACHE = TTLCache(SECRET_TTL_SECONDS)
+ENDPOINT_CACHE = TTLCache(ENDPOINT_TTL_SECONDS)
 
-def get_secret():
+secrets_client = boto3.client('secretsmanager', region_name=os.getenv('AWS_REGION'))
+rds_client = boto3.client('rds')
+
+def get_secret_name():
     env_prefix = os.environ.get("ENV_PREFIX")
-    secret_name = f"{env_prefix}RdsDBSecret"
-    region_name = os.getenv('AWS_REGION')
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region_name
-    )
+    return f"{env_prefix}RdsDBSecret"
+
+def get_cached_secret():
+    return json.loads(SECRET_CACHE.get(get_secret_name(), get_secret))
 
+def invalidate_db_credentials():
+    """
+    Forgets the cached credentials and endpoint, e.g. after an authentication failure caused by a rotation.
+    """
+    SECRET_CACHE.invalidate()
+    ENDPOINT_CACHE.invalidate()
+
+def get_secret():
     try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=secret_name
+        get_secret_value_response = secrets_client.get_secret_value(
+            SecretId=get_secret_name()
         )
     except Exception as e:
         # For a list of exceptions thrown, see
@@ -37,7 +46,6 @@ def get_rds_proxy_endpoint(proxy_name):
     """
     Fetches the endpoint of the RDS Proxy by its name.
     """
-    rds_client = boto3.client('rds')
     try:
         response = rds_client.describe_db_proxies(DBProxyName=proxy_name)
         endpoint = response['DBProxies'][0]['Endpoint']
@@ -48,17 +56,16 @@ def get_rds_proxy_endpoint(proxy_name):
 
 def load_db_config():
     """
-    Loads the static database configuration and dynamically fetches the RDS proxy endpoint.
+    Loads the static database configuration and the RDS proxy endpoint, which is cached between invocations.
     """
     env_prefix = os.environ.get("ENV_PREFIX")
     proxy_name = f"{env_prefix}RdsProxy"
-    endpoint = get_rds_proxy_endpoint(proxy_name)
+    endpoint = ENDPOINT_CACHE.get(proxy_name, lambda: get_rds_proxy_endpoint(proxy_name))
     
     if not endpoint:
         raise Exception("Failed to fetch RDS Proxy endpoint.")
-    print("fetched endpoint: ", endpoint)
     return {
         "host": endpoint,
         "port": 5432,
         "dbname": "postgres"
-    }
\ No newline at end of file
+    }
@@ -1,39 +1,187 @@
-import json
-import boto3
 import os
+import time
+import hashlib
+import boto3
+from .ttl_cache import TTLCache
+from .canvas_api_calls import get_user_info as get_canvas_user_info
+
+# Lifetime assumed for tokens whose expiry was not recorded at login or refresh
+CANVAS_TOKEN_LIFETIME_SECONDS = 3600
+IDENTITY_TTL_SECONDS = min(int(os.environ.get("IDENTITY_TTL_SECONDS", 900)), CANVAS_TOKEN_LIFETIME_SECONDS)
+# The UserSessions table shares identities between Lambdas, set to "false" to keep the cache in-process only
+SESSION_TABLE_ENABLED = os.environ.get("USER_SESSION_TABLE_ENABLED", "true") == "true"
 
-lambda_client = boto3.client('lambda')
+# Cached across warm invocations, {token hash: {"userName", "userId", "expiresAt"}}. Never refreshed ahead:
+# a token is only re-checked with Canvas once its entry expires
+IDENTITY_CACHE = TTLCache(IDENTITY_TTL_SECONDS, refresh_ahead_fraction=1)
+
+dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
 env_prefix = os.environ.get("ENV_PREFIX")
-def get_user_info(auth_token):
+users_table = dynamodb.Table(f"{env_prefix}Users")
+sessions_table = dynamodb.Table(f"{env_prefix}UserSessions")
+
+def hash_token(auth_token):
     """
-    Calls getuser info to get the user info based on the provided authentication token.
+    Tokens are only ever stored as their hash.
     """
+    return hashlib.sha256(auth_token.encode("utf-8")).hexdigest()
+
+def read_session(token_hash):
+    """
+    Returns the unexpired UserSessions item of a token hash, or None.
+    """
+    try:
+        item = sessions_table.get_item(Key={"tokenHash": token_hash}).get("Item")
+        # DynamoDB deletes expired items lazily, so they can still be returned for a while
+        if not item or item["expiresAt"] <= time.time():
+            return None
+        return item
+    except Exception as e:
+        print(f"Error reading user session: {e}")
+        return None
 
-    # Query parameter
-    # course_id = event.get("queryStringParameters", {}).get("course_id", "default-course")
+def write_session(token_hash, identity):
+    """
+    Stores the identity of a token until the token expires, as recorded by record_token.
+    Tokens issued before their expiry was recorded fall back to the Canvas token lifetime.
+    A token revoked in the meantime, e.g. logged out while Canvas was still validating it, stays revoked.
+    """
+    try:
+        sessions_table.update_item(
+            Key={"tokenHash": token_hash},
+            UpdateExpression="SET userName = :userName, userId = :userId, "
+                             "expiresAt = if_not_exists(expiresAt, :expiresAt)",
+            ConditionExpression="attribute_not_exists(revoked)",
+            ExpressionAttributeValues={
+                ":userName": identity["userName"],
+                ":userId": identity["userId"],
+                ":expiresAt": int(time.time()) + CANVAS_TOKEN_LIFETIME_SECONDS,
+            }
+        )
+    except sessions_table.meta.client.exceptions.ConditionalCheckFailedException:
+        print("Not caching the identity of a revoked token")
+    except Exception as e:
+        print(f"Error writing user session: {e}")
 
-    # Body message
-    # message_content = event.get("body", "{}")
-    # if isinstance(message_content, str):
-    #     message_content = json.loads(message_content)
+def record_token(access_token, expires_in, refresh_token=None):
+    """
+    Records when a newly issued access token expires, so that its identity is never cached beyond that.
+    With a refresh token, also records which access token it was issued with, so that a refresh can
+    invalidate the previous one.
+    """
+    if not SESSION_TABLE_ENABLED:
+        return
+    expires_at = int(time.time()) + int(expires_in)
+    try:
+        sessions_table.put_item(Item={"tokenHash": hash_token(access_token), "expiresAt": expires_at})
+        if refresh_token:
+            sessions_table.put_item(Item={
+                "tokenHash": hash_token(refresh_token),
+                "accessTokenHash": hash_token(access_token),
+                "expiresAt": expires_at,
+            })
+    except Exception as e:
+        print(f"Error recording token expiry: {e}")
 
-    payload = {
-        "headers": {
-            "Content-Type": "application/json",
-            "Authorization": auth_token,
-        }
-    }
+def invalidate_session(token_hash):
+    IDENTITY_CACHE.invalidate(token_hash)
+    if not SESSION_TABLE_ENABLED:
+        return
+    try:
+        sessions_table.delete_item(Key={"tokenHash": token_hash})
+    except Exception as e:
+        print(f"Error deleting user session: {e}")
+
+def revoke_session(token_hash):
+    """
+    Replaces the session of a token with a revoked marker, kept until the token would have expired.
+    """
+    IDENTITY_CACHE.invalidate(token_hash)
+    if not SESSION_TABLE_ENABLED:
+        return
     try:
-        response = lambda_client.invoke(
-            FunctionName=f"{env_prefix}GetUserInfoLambda",  # Replace with actual function name
-            InvocationType="RequestResponse",  # Use 'Event' for async calls
-            Payload=json.dumps(payload)
+        sessions_table.update_item(
+            Key={"tokenHash": token_hash},
+            UpdateExpression="SET revoked = :revoked, expiresAt = if_not_exists(expiresAt, :expiresAt) "
+                             "REMOVE userName, userId",
+            ExpressionAttributeValues={
+                ":revoked": True,
+                ":expiresAt": int(time.time()) + CANVAS_TOKEN_LIFETIME_SECONDS,
+            }
         )
-        response_payload = json.loads(response["Payload"].read().decode("utf-8"))
-        print("response_payload: ", response_payload)
-        body_dict = json.loads(response_payload["body"])
-        print("Body: ", body_dict, "Type: ", type(body_dict))
-        return body_dict
     except Exception as e:
-        print(f"Error invoking Lambda function: {e}")
-        return None
\ No newline at end of file
+        print(f"Error revoking user session: {e}")
+
+def invalidate_user_session(auth_token):
+    """
+    Revokes an access token on logout: it is rejected without asking Canvas until it expires, even if a
+    request that Canvas validated before the logout tries to cache its identity afterwards.
+    Other warm Lambdas may keep their in-process entry for at most IDENTITY_TTL_SECONDS.
+    """
+    revoke_session(hash_token(auth_token))
+
+def invalidate_refreshed_session(refresh_token):
+    """
+    Forgets the identity of the access token last issued with this refresh token.
+    """
+    if not SESSION_TABLE_ENABLED:
+        return
+    item = read_session(hash_token(refresh_token))
+    if item and "accessTokenHash" in item:
+        invalidate_session(item["accessTokenHash"])
+
+def resolve_identity(auth_token):
+    """
+    Looks the token up in the session table, then in Canvas. Returns the identity with the time the
+    token expires at, or None if the token was revoked or Canvas rejects it.
+    """
+    token_hash = hash_token(auth_token)
+    item = read_session(token_hash) if SESSION_TABLE_ENABLED else None
+    if item and item.get("revoked"):
+        return None
+    if item and "userName" in item:
+        return {"userName": item["userName"], "userId": int(item["userId"]), "expiresAt": int(item["expiresAt"])}
+
+    user = get_canvas_user_info(auth_token)
+    if not user or "id" not in user:
+        return None
+    identity = {"userName": user["name"], "userId": user["id"]}
+    if SESSION_TABLE_ENABLED:
+        write_session(token_hash, identity)
+    # Only a recorded expiry is known here, an unrecorded one is bounded by IDENTITY_TTL_SECONDS
+    expires_at = int(item["expiresAt"]) if item else int(time.time()) + IDENTITY_TTL_SECONDS
+    return {**identity, "expiresAt": expires_at}
+
+def get_preferred_language(user_id):
+    response = users_table.get_item(Key={"userId": user_id})
+    if "Item" in response:
+        return response["Item"].get("preferred_language", "")
+    # User does not exist, create a new one with preferred_language=""
+    users_table.put_item(Item={"userId": user_id, "preferred_language": ""})
+    return ""
+
+def get_user_info(auth_token):
+    """
+    Returns the userName, userId and preferred_language of the user the token belongs to, or None.
+    The identity is cached per token, the preferred language is always read from the Users table
+    so that updates are visible immediately.
+    """
+    try:
+        token_hash = hash_token(auth_token)
+        identity = IDENTITY_CACHE.get_many([token_hash]).get(token_hash)
+        if identity is None:
+            identity = resolve_identity(auth_token)
+            if identity is None:
+                return None
+            # Never cached beyond the token's own expiry
+            ttl_seconds = min(IDENTITY_TTL_SECONDS, identity["expiresAt"] - time.time())
+            if ttl_seconds > 0:
+                IDENTITY_CACHE.put(token_hash, identity, ttl_seconds)
+        return {
+            "userName": identity["userName"],
+            "userId": identity["userId"],
+            "preferred_language": get_preferred_language(identity["userId"]),
+        }
+    except Exception as e:
+        print(f"Error fetching user info: {e}")
+        return None
@@ -0,0 +1,169 @@
+import json
+import threading
+from abc import ABC, abstractmethod
+import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+
+# Files handled by one worker invocation, sized so that a worker finishes well within the 15 minute limit
+FILES_PER_WORK_UNIT = 25
+# Worker invocations running at the same time
+MAX_PARALLEL_WORKERS = 16
+
+# Workers run for up to 15 minutes; the default 60s read timeout would make botocore retry and duplicate them.
+# The coordinator waits on every worker, so a fanned out course must still be ingested within the coordinator's
+# own 15 minute limit: with MAX_PARALLEL_WORKERS units at a time, the slowest wave of units sets the ceiling
+lambda_client = boto3.client(
+    "lambda",
+    config=Config(read_timeout=900, connect_timeout=10, retries={"max_attempts": 0})
+)
+
+
+def plan_work_units(file_keys, canvas_content_types, file_metadata=None, canvas_document_names=None,
+                    files_per_unit=FILES_PER_WORK_UNIT):
+    """
+    Shards the course into work units: one per group of files_per_unit S3 keys, carrying the manifest
+    entries of its files, plus one unit per Canvas content type, carrying the document name it is stored under.
+    """
+    file_metadata = file_metadata or {}
+    canvas_document_names = canvas_document_names or {}
+    units = []
+    for i in range(0, len(file_keys), files_per_unit):
+        unit_keys = file_keys[i:i + files_per_unit]
+        units.append({
+            "unitId": f"files-{i // files_per_unit}",
+            "fileKeys": unit_keys,
+            "fileMetadata": {key: file_metadata[key] for key in unit_keys if key in file_metadata},
+            "canvasContentTypes": [],
+        })
+    for content_type in canvas_content_types:
+        units.append({
+            "unitId": f"canvas-{content_type}",
+            "fileKeys": [],
+            "canvasContentTypes": [content_type],
+            "canvasDocumentNames": {content_type: canvas_document_names.get(content_type, content_type)},
+        })
+    return units
+
+
+def get_unit_documents(unit):
+    """
+    The (document_key, document_name) pairs a unit is responsible for, reported as failed if the whole unit fails.
+    """
+    documents = [(file_key, file_key) for file_key in unit["fileKeys"]]
+    document_names = unit.get("canvasDocumentNames", {})
+    documents += [
+        (f"canvas:{content_type}", document_names.get(content_type, content_type))
+        for content_type in unit["canvasContentTypes"]
+    ]
+    return documents
+
+
+class CompletionTracker:
+    """
+    Collects the result reported by every work unit. A unit that could not report, because its invocation
+    failed or timed out, has all of its documents counted as failed.
+    """
+
+    def __init__(self, units):
+        self.units = {unit["unitId"]: unit for unit in units}
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def record(self, unit_id, result):
+        with self.lock:
+            self.results[unit_id] = result
+
+    def record_failure(self, unit_id, error):
+        print(f"Work unit {unit_id} failed: {error}")
+        self.record(unit_id, {
+            "failedDocuments": get_unit_documents(self.units[unit_id]),
+            "changedRows": 0,
+            "error": str(error),
+        })
+
+    def pending(self):
+        with self.lock:
+            return [unit_id for unit_id in self.units if unit_id not in self.results]
+
+    def failed_documents(self):
+        with self.lock:
+            return [tuple(document) for result in self.results.values() for document in result["failedDocuments"]]
+
+    def changed_rows(self):
+        with self.lock:
+            return sum(result["changedRows"] for result in self.results.values())
+
+
+class WorkerExecutor(ABC):
+    """
+    Runs work units in parallel through invoke(event) and records every outcome in the tracker.
+    """
+
+    def __init__(self, max_workers=MAX_PARALLEL_WORKERS):
+        self.max_workers = max_workers
+
+    @abstractmethod
+    def invoke(self, event):
+        """
+        Runs the worker on one event and returns its response.
+        """
+
+    def run(self, units, payload, tracker):
+        def run_unit(unit):
+            try:
+                response = self.invoke({"worker": {**payload, **unit}})
+                tracker.record(unit["unitId"], parse_worker_response(response))
+            except Exception as e:
+                tracker.record_failure(unit["unitId"], e)
+
+        if units:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(units))) as executor:
+                list(executor.map(run_unit, units))
+        return tracker
+
+
+class InProcessWorkerExecutor(WorkerExecutor):
+    """
+    Runs work units on local threads by calling the worker handler directly, e.g. when testing.
+    """
+
+    def __init__(self, handler, max_workers=MAX_PARALLEL_WORKERS):
+        super().__init__(max_workers)
+        self.handler = handler
+
+    def invoke(self, event):
+        return self.handler(event, None)
+
+
+class LambdaWorkerExecutor(WorkerExecutor):
+    """
+    Runs every work unit in its own synchronous invocation of the worker function.
+    """
+
+    def __init__(self, function_name, max_workers=MAX_PARALLEL_WORKERS):
+        super().__init__(max_workers)
+        self.function_name = function_name
+
+    def invoke(self, event):
+        response = lambda_client.invoke(
+            FunctionName=self.function_name,
+            InvocationType="RequestResponse",
+            Payload=json.dumps(event)
+        )
+        if response.get("FunctionError"):
+            raise RuntimeError(response["Payload"].read().decode("utf-8"))
+        return json.loads(response["Payload"].read().decode("utf-8"))
+
+
+def parse_worker_response(response):
+    """
+    Extracts a unit result from a worker's construct_response output.
+    """
+    if not response or response.get("statusCode") != 200:
+        raise RuntimeError(f"Worker returned {response}")
+    body = json.loads(response["body"])
+    return {
+        "failedDocuments": body.get("failedDocuments", []),
+        "changedRows": body.get("changedRows", 0),
+    }
@@ -0,0 +1,78 @@
+import os
+import time
+import boto3
+from .ttl_cache import TTLCache
+from .canvas_api_calls import get_instructor_courses
+
+# How long a user's instructor course set is trusted before Canvas is asked again
+INSTRUCTOR_COURSES_TTL_SECONDS = int(os.environ.get("INSTRUCTOR_COURSES_TTL_SECONDS", 300))
+
+# Cached across warm invocations, {user id: set of course ids}. Never refreshed ahead, see get_instructor_course_ids
+INSTRUCTOR_COURSES_CACHE = TTLCache(INSTRUCTOR_COURSES_TTL_SECONDS, refresh_ahead_fraction=1)
+
+dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+env_prefix = os.environ.get("ENV_PREFIX")
+# The course set is also kept on the user's item so that the analytics Lambdas share it
+users_table = dynamodb.Table(f"{env_prefix}Users")
+
+def read_stored_course_ids(user_id):
+    try:
+        item = users_table.get_item(Key={"userId": int(user_id)}).get("Item")
+        if not item or item.get("instructorCoursesExpiresAt", 0) <= time.time():
+            return None
+        return {int(course_id) for course_id in item.get("instructorCourseIds", [])}
+    except Exception as e:
+        print(f"Error reading instructor courses: {e}")
+        return None
+
+def store_course_ids(user_id, course_ids):
+    try:
+        users_table.update_item(
+            Key={"userId": int(user_id)},
+            UpdateExpression="SET instructorCourseIds = :ids, instructorCoursesExpiresAt = :exp",
+            ExpressionAttributeValues={
+                ":ids": sorted(course_ids),
+                ":exp": int(time.time()) + INSTRUCTOR_COURSES_TTL_SECONDS,
+            }
+        )
+    except Exception as e:
+        print(f"Error storing instructor courses: {e}")
+
+def fetch_course_ids(auth_token, user_id, use_stored=True):
+    if use_stored:
+        course_ids = read_stored_course_ids(user_id)
+        if course_ids is not None:
+            return course_ids
+
+    courses_as_instructor = get_instructor_courses(auth_token)
+    if courses_as_instructor is None:
+        return None
+    course_ids = {int(course["id"]) for course in courses_as_instructor}
+    store_course_ids(user_id, course_ids)
+    return course_ids
+
+def invalidate_instructor_courses(user_id):
+    INSTRUCTOR_COURSES_CACHE.invalidate(str(user_id))
+
+def get_instructor_course_ids(auth_token, user_id, refresh=False):
+    """
+    Returns the ids of the courses the user teaches, or None if Canvas could not be reached.
+    The set is cached for a few minutes per user, refresh=True reloads it from Canvas.
+    """
+    key = str(user_id)
+    if refresh:
+        invalidate_instructor_courses(user_id)
+    return INSTRUCTOR_COURSES_CACHE.get(key, lambda: fetch_course_ids(auth_token, user_id, use_stored=not refresh))
+
+def is_course_instructor(auth_token, user_id, course_id):
+    """
+    Whether the user teaches the course, or None if Canvas could not be reached. A course missing from
+    the cached set is checked again against Canvas, in case the user was added to it recently.
+    """
+    course_ids = get_instructor_course_ids(auth_token, user_id)
+    if course_ids is not None and int(course_id) in course_ids:
+        return True
+    course_ids = get_instructor_course_ids(auth_token, user_id, refresh=True)
+    if course_ids is None:
+        return None
+    return int(course_id) in course_ids
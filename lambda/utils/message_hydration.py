@@ -0,0 +1,52 @@
+import os
+import time
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_LIMIT = 100
+MAX_PARALLEL_PAGES = 4
+MAX_UNPROCESSED_RETRIES = 5
+RETRY_BASE_DELAY_SECONDS = 0.05
+
+dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+env_prefix = os.environ.get("ENV_PREFIX")
+MESSAGES_TABLE_NAME = f"{env_prefix}Messages"
+
+def fetch_messages_page(message_ids):
+    """
+    Fetches up to 100 messages with BatchGetItem and returns {message_id: item}.
+    Keys DynamoDB leaves unprocessed (throttling, 16MB response limit) are requested again with backoff.
+    """
+    items = {}
+    request_items = {MESSAGES_TABLE_NAME: {"Keys": [{"message_id": message_id} for message_id in message_ids]}}
+    for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+        response = dynamodb.batch_get_item(RequestItems=request_items)
+        for item in response.get("Responses", {}).get(MESSAGES_TABLE_NAME, []):
+            items[item["message_id"]] = item
+        request_items = response.get("UnprocessedKeys")
+        if not request_items:
+            return items
+        if attempt < MAX_UNPROCESSED_RETRIES:
+            time.sleep(RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+    raise RuntimeError(f"Messages still unprocessed after {MAX_UNPROCESSED_RETRIES} retries")
+
+def hydrate_messages(message_ids):
+    """
+    Returns the messages of a conversation in message_list order. Ids are fetched once each,
+    in pages of 100 that run in parallel, and messages that no longer exist are skipped.
+    """
+    unique_ids = list(dict.fromkeys(message_ids))
+    if not unique_ids:
+        return []
+
+    pages = [unique_ids[i:i + BATCH_GET_LIMIT] for i in range(0, len(unique_ids), BATCH_GET_LIMIT)]
+    items = {}
+    if len(pages) == 1:
+        items.update(fetch_messages_page(pages[0]))
+    else:
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_PAGES, len(pages))) as executor:
+            for page_items in executor.map(fetch_messages_page, pages):
+                items.update(page_items)
+
+    return [items[message_id] for message_id in unique_ids if message_id in items]
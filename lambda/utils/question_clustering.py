@@ -0,0 +1,104 @@
+import numpy as np
+from .generate_embeddings import embed_chunks
+from .ttl_cache import TTLCache
+
+# Questions whose embeddings have at least this cosine similarity to a cluster's leader join the cluster
+SIMILARITY_THRESHOLD = 0.8
+# Most recent distinct questions clustered per request, bounds the embedding and clustering work
+MAX_QUESTIONS = 2000
+# Questions shown to the LLM for each cluster it names
+REPRESENTATIVES_PER_CLUSTER = 5
+# Most questions sent to Bedrock per request, keeps a cold request well within API Gateway's 29 seconds.
+# The most asked questions are embedded first, the rest follow on later requests
+MAX_NEW_EMBEDDINGS = 200
+QUESTION_EMBEDDING_TTL_SECONDS = 6 * 3600
+
+# Student questions stay out of the shared embedding cache. They are kept in-process, one entry per course
+# holding at most MAX_QUESTIONS embeddings: {course_id: {question: float32 vector}}
+QUESTION_EMBEDDING_CACHE = TTLCache(QUESTION_EMBEDDING_TTL_SECONDS, refresh_ahead_fraction=1)
+
+def normalize_question(content):
+    return " ".join(content.strip().lower().split())
+
+def count_questions(messages):
+    """
+    {normalized question: number of times it was asked}, keeping the MAX_QUESTIONS most recent distinct questions.
+    """
+    counts = {}
+    for message in sorted(messages, key=lambda m: m.get("msg_timestamp", ""), reverse=True):
+        question = normalize_question(message.get("content", ""))
+        if not question:
+            continue
+        if question in counts:
+            counts[question] += 1
+        elif len(counts) < MAX_QUESTIONS:
+            counts[question] = 1
+    return counts
+
+def cluster_embeddings(embeddings, weights, similarity_threshold=SIMILARITY_THRESHOLD):
+    """
+    Greedy leader clustering: the most asked unassigned question starts a cluster and takes every
+    unassigned question similar enough to it. Returns a list of index arrays, largest total weight first.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    unassigned = np.argsort(-weights, kind="stable")
+    clusters = []
+    while unassigned.size:
+        leader = unassigned[0]
+        similarities = vectors[unassigned] @ vectors[leader]
+        members = similarities >= similarity_threshold
+        members[0] = True
+        clusters.append(unassigned[members])
+        unassigned = unassigned[~members]
+
+    clusters.sort(key=lambda members: weights[members].sum(), reverse=True)
+    return clusters
+
+def embed_questions(course_id, questions, counts):
+    """
+    {question: embedding} for the questions of a course, embedding at most MAX_NEW_EMBEDDINGS uncached ones.
+    Only the given questions stay cached for the course.
+    """
+    course_id = str(course_id)
+    cached = QUESTION_EMBEDDING_CACHE.get_many([course_id]).get(course_id, {})
+    embeddings = {question: cached[question] for question in questions if question in cached}
+
+    missing = sorted((question for question in questions if question not in embeddings), key=lambda q: -counts[q])
+    if len(missing) > MAX_NEW_EMBEDDINGS:
+        print(f"Embedding {MAX_NEW_EMBEDDINGS} of {len(missing)} new questions, the rest are left out of this request")
+        missing = missing[:MAX_NEW_EMBEDDINGS]
+    for question, embedding in zip(missing, embed_chunks(missing)):
+        # Questions that failed to embed are left out of the clustering
+        if embedding:
+            embeddings[question] = np.asarray(embedding, dtype=np.float32)
+
+    QUESTION_EMBEDDING_CACHE.put(course_id, embeddings)
+    return embeddings
+
+def find_question_clusters(course_id, messages, num_clusters):
+    """
+    Groups the student questions of the messages by meaning and returns the num_clusters most asked groups
+    as [{"count": times asked, "questions": most asked questions of the group}].
+    Returns None if the questions could not be embedded.
+    """
+    counts = count_questions(messages)
+    if not counts:
+        return []
+
+    embeddings = embed_questions(course_id, list(counts), counts)
+    if not embeddings:
+        return None
+    questions = list(embeddings)
+    weights = [counts[question] for question in questions]
+    clusters = cluster_embeddings([embeddings[question] for question in questions], weights)
+
+    return [
+        {
+            "count": int(sum(weights[i] for i in members)),
+            "questions": [questions[i] for i in members[:REPRESENTATIVES_PER_CLUSTER]],
+        }
+        for members in clusters[:num_clusters]
+    ]
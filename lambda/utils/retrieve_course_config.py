@@ -1,30 +1,11 @@
 import json
 import psycopg2
 import psycopg2.extras
-from .get_rds_secret import get_cached_secret
-from .get_rds_secret import load_db_config
+from .db_connection import get_connection
 import os
 
-# Cache for database connection
-DB_CONNECTION = None
 env_prefix = os.environ.get("ENV_PREFIX")
 
-def get_db_connection():
-    """Establishes or retrieves a cached database connection."""
-    global DB_CONNECTION
-    if DB_CONNECTION is None or DB_CONNECTION.closed:
-        credentials = get_cached_secret()
-        static_db_config = load_db_config()
-        # Combine static DB config and dynamic credentials
-        DB_CONFIG = {
-            **static_db_config,
-            "user": credentials['username'],
-            "password": credentials['password'],
-        }
-        print("Connecting to database")
-        DB_CONNECTION = psycopg2.connect(**DB_CONFIG)
-    return DB_CONNECTION
-
 def call_get_course_config(auth_token, course_id, lambda_client):
     """
     Calls getcourseconfig.
@@ -55,11 +36,17 @@ def call_get_course_config(auth_token, course_id, lambda_client):
 
 def retrieve_course_config(course_id):
     try:
-        # Connect to the PostgreSQL database
-        print("DB_CONNECTION: ", DB_CONNECTION)
-        connection = get_db_connection()  # Get cached DB connection
-        print("Connected to database")
-        cursor = connection.cursor()
+        with get_connection() as connection:
+            return read_or_create_course_config(connection, course_id)
+    except Exception as e:
+        print(f"Error: {e}")
+        return "Cannot connect to db"
+
+def read_or_create_course_config(connection, course_id):
+    """
+    Reads the course configuration, inserting the default one if the course has none yet.
+    """
+    with connection.cursor() as cursor:
 
         # Query the course configuration
         query = """
@@ -140,15 +127,8 @@ def retrieve_course_config(course_id):
                 "autoUpdateOn": row[6]
             }
 
-        # Close database connection
-        cursor.close()
-        connection.close()
-
         return response_body
-    except Exception as e:
-        print(f"Error: {e}")
-        return "Cannot connect to db"
-    
+
 def create_system_prompt(supported_questions, custom_response_format):
     """
     Generate a system prompt for the course assistant based on professor's settings,
@@ -1,90 +1,59 @@
 import os
-import json
-import re
 import boto3
+from boto3.dynamodb.conditions import Key
 
 DEBUG = True
 
-lambda_client = boto3.client('lambda')
-session = boto3.Session()
+# Conversations GSIs: course_id + student_id, and course_id + time_created
+COURSE_STUDENT_INDEX = "CourseStudentIndex"
+COURSE_TIME_INDEX = "CourseTimeIndex"
+
 env_prefix = os.environ.get("ENV_PREFIX")
 dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
 conversations_table = dynamodb.Table(f"{env_prefix}Conversations")   # Replace with your table name
-messages_table = dynamodb.Table(f"{env_prefix}Messages")
-
-def scan_all_conversations_by_student(course_id, student_id):
-    all_items = []
-    start_key = None
 
+def query_pages(**query_kwargs):
+    """
+    Yields the items of every page of a Conversations query, following LastEvaluatedKey.
+    """
     while True:
-        scan_kwargs = {
-            "FilterExpression": "course_id = :course_id AND student_id = :student_id",
-            "ExpressionAttributeValues": {
-                ":course_id": str(course_id),
-                ":student_id": str(student_id)
-            }
-        }
-        if start_key:
-            scan_kwargs["ExclusiveStartKey"] = start_key
-
-        response = conversations_table.scan(**scan_kwargs)
+        response = conversations_table.query(**query_kwargs)
         items = response.get("Items", [])
-        all_items.extend(items)
+        if DEBUG:
+            print(f"Fetched {len(items)} conversations in this page")
+        yield items
 
-        start_key = response.get("LastEvaluatedKey")
-        if not start_key:
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
             break
+        query_kwargs["ExclusiveStartKey"] = last_evaluated_key
 
-    return all_items
+def query_all(**query_kwargs):
+    return [item for page in query_pages(**query_kwargs) for item in page]
 
+def scan_all_conversations_by_student(course_id, student_id):
+    """
+    Conversations of one student in a course.
+    """
+    return query_all(
+        IndexName=COURSE_STUDENT_INDEX,
+        KeyConditionExpression=Key("course_id").eq(str(course_id)) & Key("student_id").eq(str(student_id))
+    )
 
 def scan_all_conversations(course_id, time_threshold):
-    items = []
-    exclusive_start_key = None
-
-    while True:
-        scan_kwargs = {
-            "FilterExpression": "course_id = :course_id AND time_created >= :time_threshold",
-            "ExpressionAttributeValues": {
-                ":course_id": course_id,
-                ":time_threshold": time_threshold
-            }
-        }
-        if exclusive_start_key:
-            scan_kwargs["ExclusiveStartKey"] = exclusive_start_key
-
-        response = conversations_table.scan(**scan_kwargs)
-        items.extend(response.get("Items", []))
-
-        if DEBUG:
-            print(f"Fetched {len(response.get('Items', []))} conversations in this page")
-
-        exclusive_start_key = response.get("LastEvaluatedKey")
-        if not exclusive_start_key:
-            break
-
-    return items
-
+    """
+    Conversations of a course created at or after time_threshold (an ISO timestamp).
+    """
+    return query_all(
+        IndexName=COURSE_TIME_INDEX,
+        KeyConditionExpression=Key("course_id").eq(str(course_id)) & Key("time_created").gte(time_threshold)
+    )
 
 def scan_all_conversations_for_course(course_id):
-    all_items = []
-    last_evaluated_key = None
-
-    while True:
-        scan_kwargs = {
-            "FilterExpression": "course_id = :course_id",
-            "ExpressionAttributeValues": {":course_id": str(course_id)}
-        }
-
-        if last_evaluated_key:
-            scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
-
-        response = conversations_table.scan(**scan_kwargs)
-        items = response.get("Items", [])
-        all_items.extend(items)
-
-        last_evaluated_key = response.get("LastEvaluatedKey")
-        if not last_evaluated_key:
-            break
-
-    return all_items
\ No newline at end of file
+    """
+    Every conversation of a course.
+    """
+    return query_all(
+        IndexName=COURSE_STUDENT_INDEX,
+        KeyConditionExpression=Key("course_id").eq(str(course_id))
+    )
@@ -0,0 +1,176 @@
+import hashlib
+import psycopg2
+import psycopg2.extras
+
+# Rows sent to PostgreSQL per INSERT statement
+INSERT_PAGE_SIZE = 500
+
+def compute_content_hash(document_content):
+    """
+    SHA-256 of the chunk text, used to reject duplicate chunks through the unique content_hash column.
+    """
+    return hashlib.sha256(document_content.encode("utf-8")).hexdigest()
+
+def format_vector(embedding):
+    """
+    Formats an embedding as a pgvector literal like '[0.1, 0.2, 0.3]'.
+    """
+    return f"[{', '.join(map(str, embedding))}]"
+
+def store_embeddings(connection, course_id, rows):
+    """
+    Bulk upserts (document_key, document_name, embedding, source_url, document_content, page_number) rows into
+    course_vectors_{course_id} over an existing connection. A chunk whose content is already stored is
+    reassigned to the given document instead of being duplicated.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+
+    # A statement cannot touch the same row twice, so repeated chunks are only sent once
+    values = {}
+    for document_key, document_name, embedding, source_url, document_content, page_number in rows:
+        content_hash = compute_content_hash(document_content)
+        values[content_hash] = (
+            document_key, document_name, format_vector(embedding), source_url, document_content, content_hash, page_number
+        )
+    upsert_query = f"""
+    INSERT INTO course_vectors_{course_id}
+        (document_key, document_name, embeddings, sourceURL, document_content, content_hash, page_number)
+    VALUES %s
+    ON CONFLICT (content_hash) DO UPDATE
+    SET document_key = EXCLUDED.document_key, document_name = EXCLUDED.document_name,
+        sourceURL = EXCLUDED.sourceURL, page_number = EXCLUDED.page_number
+    RETURNING id;
+    """
+    try:
+        with connection.cursor() as cursor:
+            written = psycopg2.extras.execute_values(
+                cursor,
+                upsert_query,
+                # Sorted so that concurrent writers lock conflicting rows in the same order
+                [values[content_hash] for content_hash in sorted(values)],
+                template="(%s, %s, %s::vector, %s, %s, %s, %s)",
+                page_size=INSERT_PAGE_SIZE,
+                fetch=True
+            )
+        connection.commit()
+        print(f"SQL SUCCESS: Stored {len(written)} of {len(rows)} embeddings")
+        return len(written)
+    except Exception as e:
+        connection.rollback()
+        print(f"Error inserting embeddings: {e}")
+        return 0
+
+def get_stored_content_hashes(connection, course_id, document_keys=None):
+    """
+    Returns the set of content hashes already stored for the course, optionally limited to some documents.
+    Rows stored before document keys existed are left out so that they get re-keyed by the next full sync.
+    """
+    query = f"SELECT content_hash FROM course_vectors_{course_id} WHERE content_hash IS NOT NULL AND document_key IS NOT NULL"
+    params = ()
+    if document_keys is not None:
+        query += " AND document_key = ANY(%s)"
+        params = (list(document_keys),)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query + ";", params)
+            stored_hashes = {row[0] for row in cursor.fetchall()}
+        connection.commit()
+        return stored_hashes
+    except Exception as e:
+        connection.rollback()
+        print(f"Error reading stored content hashes: {e}")
+        return set()
+
+def has_document_vectors(connection, course_id):
+    """
+    Whether the course table holds any row with a document key, i.e. was filled by a keyed sync.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM course_vectors_{course_id} WHERE document_key IS NOT NULL LIMIT 1;")
+            found = cursor.fetchone() is not None
+        connection.commit()
+        return found
+    except Exception as e:
+        connection.rollback()
+        print(f"Error checking stored vectors: {e}")
+        return False
+
+def copy_document_vectors(connection, source_course_id, target_course_id, documents):
+    """
+    Copies the rows of the given (document_key, document_name) documents from one course table to another.
+    Rows stored before document keys existed are matched by document name. Returns the number of rows copied.
+    """
+    if not documents:
+        return 0
+    document_keys = [document_key for document_key, _ in documents]
+    document_names = [document_name for _, document_name in documents]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO course_vectors_{target_course_id}
+                    (document_key, document_name, embeddings, created_at, sourceURL, document_content, content_hash, page_number)
+                SELECT document_key, document_name, embeddings, created_at, sourceURL, document_content, content_hash, page_number
+                FROM course_vectors_{source_course_id}
+                WHERE document_key = ANY(%s) OR (document_key IS NULL AND document_name = ANY(%s))
+                ON CONFLICT (content_hash) DO NOTHING;
+                """,
+                (document_keys, document_names)
+            )
+            copied = cursor.rowcount
+        connection.commit()
+        print(f"Copied {copied} vectors into course_vectors_{target_course_id}")
+        return copied
+    except Exception as e:
+        connection.rollback()
+        print(f"Error copying document vectors: {e}")
+        return 0
+
+def prune_document_vectors(connection, course_id, document_key, live_hashes):
+    """
+    Deletes the rows of one document whose chunk is no longer part of it. Returns the number of rows deleted.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM course_vectors_{course_id}
+                WHERE document_key = %s AND NOT (content_hash = ANY(%s));
+                """,
+                (document_key, list(live_hashes))
+            )
+            deleted = cursor.rowcount
+        connection.commit()
+        return deleted
+    except Exception as e:
+        connection.rollback()
+        print(f"Error pruning vectors of {document_key}: {e}")
+        return 0
+
+def delete_document_vectors(connection, course_id, document_keys=None, key_prefix=None):
+    """
+    Deletes every row belonging to the given documents, or to every document whose key starts with key_prefix.
+    Returns the number of rows deleted.
+    """
+    if document_keys is not None:
+        if not document_keys:
+            return 0
+        condition, params = "document_key = ANY(%s)", (list(document_keys),)
+    elif key_prefix is not None:
+        condition, params = "starts_with(document_key, %s)", (key_prefix,)
+    else:
+        raise ValueError("Either document_keys or key_prefix is required")
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM course_vectors_{course_id} WHERE {condition};", params)
+            deleted = cursor.rowcount
+        connection.commit()
+        print(f"Deleted {deleted} vectors of removed documents from course_vectors_{course_id}")
+        return deleted
+    except Exception as e:
+        connection.rollback()
+        print(f"Error deleting document vectors: {e}")
+        return 0
@@ -9,7 +9,8 @@ def translate_document_names(documents, target_language, translate_client):
         translated_docs.append({
             "documentName": translated_name,  # Translated name
             "sourceUrl": doc["sourceUrl"],  # Unchanged
-            "documentContent": doc["documentContent"]  # Unchanged
+            "documentContent": doc["documentContent"],  # Unchanged
+            "pageNumber": doc.get("pageNumber")  # Unchanged
         })
 
     return translated_docs
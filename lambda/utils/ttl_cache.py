@@ -0,0 +1,86 @@
+import time
+import threading
+
+# Entries older than this fraction of their TTL are reloaded in the background while still being served
+REFRESH_AHEAD_FRACTION = 0.8
+
+
+class TTLCache:
+    """
+    In-process cache that lives across warm invocations. Expired entries are reloaded synchronously,
+    entries close to expiry are served as-is while a background thread reloads them (refresh-ahead).
+    """
+
+    def __init__(self, ttl_seconds, refresh_ahead_fraction=REFRESH_AHEAD_FRACTION):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ahead_fraction = refresh_ahead_fraction
+        self.entries = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def get(self, key, loader, ttl_seconds=None):
+        """
+        Returns the cached value of key, calling loader() to fill or refresh it.
+        A loader returning None is not cached. ttl_seconds overrides the cache TTL for this entry.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or now >= entry["expires_at"]:
+            return self.load(key, loader, ttl_seconds)
+
+        if now >= entry["refresh_at"]:
+            with self.lock:
+                start_refresh = key not in self.refreshing
+                self.refreshing.add(key)
+            if start_refresh:
+                threading.Thread(target=self.refresh, args=(key, loader, ttl_seconds), daemon=True).start()
+        return entry["value"]
+
+    def get_many(self, keys):
+        """
+        Returns {key: value} for the keys that have an unexpired entry, without loading the others.
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {
+                key: self.entries[key]["value"]
+                for key in keys
+                if key in self.entries and now < self.entries[key]["expires_at"]
+            }
+
+    def load(self, key, loader, ttl_seconds=None):
+        value = loader()
+        if value is not None:
+            self.put(key, value, ttl_seconds)
+        return value
+
+    def refresh(self, key, loader, ttl_seconds=None):
+        try:
+            self.load(key, loader, ttl_seconds)
+        except Exception as e:
+            # The current value stays in use until it expires
+            print(f"Background refresh of {key} failed: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def put(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = {
+                "value": value,
+                "expires_at": now + ttl,
+                "refresh_at": now + ttl * self.refresh_ahead_fraction,
+            }
+
+    def invalidate(self, key=None):
+        """
+        Drops one entry, or every entry when no key is given.
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
@@ -14,6 +14,7 @@ from aws_cdk import (
     aws_events as events,
     aws_events_targets as targets,
     Duration,
+    Size,
     SecretValue,
     aws_s3_notifications as s3_notifications,
     CfnOutput # Import CfnOutput
@@ -147,6 +148,8 @@ class PrivAceItEceCapstoneMainStack(Stack):
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
             removal_policy=RemovalPolicy.DESTROY  # Change to RETAIN for production
         )
+        # CourseIdIndex sorts on "timestamp", which messages do not have, so it stays empty and is unused.
+        # Remove it in a later deployment: a DynamoDB update can create or delete only one GSI at a time
         messages_table.add_global_secondary_index(
             index_name="CourseIdIndex",
             partition_key=dynamodb.Attribute(
@@ -158,6 +161,17 @@ class PrivAceItEceCapstoneMainStack(Stack):
                 type=dynamodb.AttributeType.STRING
             )
         )
+        messages_table.add_global_secondary_index(
+            index_name="CourseSourceTimeIndex",
+            partition_key=dynamodb.Attribute(
+                name="course_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="source_timestamp",  # "{msg_source}#{msg_timestamp}"
+                type=dynamodb.AttributeType.STRING
+            )
+        )
 
         # Create the Conversations Table
         conversations_table = dynamodb.Table(
@@ -181,6 +195,49 @@ class PrivAceItEceCapstoneMainStack(Stack):
                 type=dynamodb.AttributeType.STRING
             )
         )
+        conversations_table.add_global_secondary_index(
+            index_name="CourseTimeIndex",
+            partition_key=dynamodb.Attribute(
+                name="course_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="time_created",
+                type=dynamodb.AttributeType.STRING
+            )
+        )
+
+        # Create the Course Daily Stats Table, engagement counters maintained by studentSendMsg
+        course_daily_stats_table = dynamodb.Table(
+            self, f"{env_prefix}CourseDailyStatsTable",
+            table_name=f"{env_prefix}CourseDailyStats",  # Custom name for the table
+            partition_key=dynamodb.Attribute(
+                name="course_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="day",  # YYYY-MM-DD (UTC)
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY  # Change to RETAIN for production
+        )
+
+        # Create the Course Material Stats Table, per day reference counts of course documents
+        course_material_stats_table = dynamodb.Table(
+            self, f"{env_prefix}CourseMaterialStatsTable",
+            table_name=f"{env_prefix}CourseMaterialStats",  # Custom name for the table
+            partition_key=dynamodb.Attribute(
+                name="course_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="day_document",  # "{YYYY-MM-DD}#{document hash}"
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY  # Change to RETAIN for production
+        )
 
         # Create the User Table
         users_table = dynamodb.Table(
@@ -194,6 +251,19 @@ class PrivAceItEceCapstoneMainStack(Stack):
             removal_policy=RemovalPolicy.DESTROY  # Change to RETAIN for production
         )
 
+        # Create the User Sessions Table, caches the user behind a Canvas token (stored hashed) until expiresAt
+        user_sessions_table = dynamodb.Table(
+            self, f"{env_prefix}UserSessionsTable",
+            table_name=f"{env_prefix}UserSessions",  # Custom name for the table
+            partition_key=dynamodb.Attribute(
+                name="tokenHash",
+                type=dynamodb.AttributeType.STRING
+            ),
+            time_to_live_attribute="expiresAt",
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY  # Change to RETAIN for production
+        )
+
         # Set up layers for lambda functions
         pymupdf_layer = _lambda.LayerVersion(
             self, 
@@ -260,6 +330,7 @@ class PrivAceItEceCapstoneMainStack(Stack):
             ),
             timeout=Duration.minutes(15),
             memory_size=1024,  # Increase from 128MB to 512MB/1024MB/1536MB as needed
+            ephemeral_storage_size=Size.mebibytes(2048),  # PDFs are spooled to /tmp while being read
             environment={
                 "ENV_PREFIX": env_prefix
             },
@@ -342,7 +413,7 @@ class PrivAceItEceCapstoneMainStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_9,
             code=_lambda.Code.from_asset("lambda"),
             handler="getCourseConfig.lambda_handler",
-            layers=[boto3_layer, psycopg_layer],
+            layers=[boto3_layer, psycopg_layer, requests_layer],
             vpc=my_vpc,
             security_groups=[lambda_sg],
             vpc_subnets=ec2.SubnetSelection(
@@ -399,15 +470,17 @@ class PrivAceItEceCapstoneMainStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_9,
             code=_lambda.Code.from_asset("lambda"),
             handler="studentSendMsg.lambda_handler",
-            layers=[langchain_layer, pymupdf_layer, other_text_related_layer, boto3_layer, psycopg_layer],
+            layers=[langchain_layer, pymupdf_layer, other_text_related_layer, boto3_layer, psycopg_layer, requests_layer],
             vpc=my_vpc,
             security_groups=[lambda_sg],
             vpc_subnets=ec2.SubnetSelection(
                 subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
             ),
             timeout=Duration.minutes(15),
+            memory_size=1024,  # Retrieval and completion run in-process in the local chat engine mode
             environment={
-                "ENV_PREFIX": env_prefix
+                "ENV_PREFIX": env_prefix,
+                "CHAT_ENGINE_MODE": "local"
             },
         )
 
@@ -596,6 +669,7 @@ class PrivAceItEceCapstoneMainStack(Stack):
                 subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
             ),
             timeout=Duration.minutes(15),
+            memory_size=1024,  # Upload part buffers of MAX_UPLOAD_WORKERS files, see refreshContent.TRANSFER_CONFIG
             environment={
                 "ENV_PREFIX": env_prefix
             },
@@ -639,6 +713,26 @@ class PrivAceItEceCapstoneMainStack(Stack):
             },
         )
 
+        # One-off backfills of data written before a feature existed, invoked manually (see README)
+        backfill_analytics_lambda = _lambda.Function(
+            self,
+            f"{env_prefix}BackfillAnalyticsLambda",
+            function_name=f"{env_prefix}BackfillAnalyticsLambda",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            code=_lambda.Code.from_asset("lambda"),
+            handler="backfillAnalytics.lambda_handler",
+            layers=[boto3_layer, psycopg_layer, requests_layer],
+            vpc=my_vpc,
+            security_groups=[lambda_sg],
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            timeout=Duration.minutes(15),
+            environment={
+                "ENV_PREFIX": env_prefix
+            },
+        )
+
         generate_llm_prompt_lambda = _lambda.Function(
             self,
             f"{env_prefix}GenerateLLMPromptLambda",
@@ -704,14 +798,14 @@ class PrivAceItEceCapstoneMainStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_9,
             code=_lambda.Code.from_asset("lambda"),
             handler="generateSuggestions.lambda_handler",
-            layers=[langchain_layer, boto3_layer, psycopg_layer, other_text_related_layer],
+            layers=[langchain_layer, boto3_layer, psycopg_layer, other_text_related_layer, requests_layer],
             vpc=my_vpc,
             security_groups=[lambda_sg],
             vpc_subnets=ec2.SubnetSelection(
                 subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
             ),
             timeout=Duration.minutes(15),
-            memory_size=256,
+            memory_size=1024,  # Retrieval and completion run in-process in the local chat engine mode
             environment={
                 "ENV_PREFIX": env_prefix
             },
@@ -743,7 +837,7 @@ class PrivAceItEceCapstoneMainStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_9,
             code=_lambda.Code.from_asset("lambda"),  # Points to the lambda directory
             handler="restorePastSession.lambda_handler",
-            layers=[langchain_layer, boto3_layer, psycopg_layer],
+            layers=[langchain_layer, boto3_layer, psycopg_layer, requests_layer],
             vpc=my_vpc,
             security_groups=[lambda_sg],
             vpc_subnets=ec2.SubnetSelection(
@@ -762,7 +856,7 @@ class PrivAceItEceCapstoneMainStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_9,
             code=_lambda.Code.from_asset("lambda"),  # Points to the lambda directory
             handler="getAllMaterials.lambda_handler",
-            layers=[langchain_layer, boto3_layer, psycopg_layer],
+            layers=[langchain_layer, boto3_layer, psycopg_layer, requests_layer],
             vpc=my_vpc,
             security_groups=[lambda_sg],
             vpc_subnets=ec2.SubnetSelection(
@@ -822,6 +916,7 @@ class PrivAceItEceCapstoneMainStack(Stack):
         shared_policy_for_lambda.attach_to_role(update_user_language_lambda.role)
         shared_policy_for_lambda.attach_to_role(generate_suggestions_lambda.role)
         shared_policy_for_lambda.attach_to_role(get_all_materials_lambda.role)
+        shared_policy_for_lambda.attach_to_role(backfill_analytics_lambda.role)
 
         recent_course_data_analysis.add_to_role_policy(
             iam.PolicyStatement(